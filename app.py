@@ -9,23 +9,96 @@ from flask import (
     url_for,
     flash,
     send_from_directory,
+    g,
+    Response,
 )
+import csv
+import io
 import json
+import logging
+import math
 import os
+import threading
 from datetime import datetime, timezone, timedelta
 import uuid
 from functools import wraps
 import hashlib
 import pymongo
-from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
 
+import assets
+import logs
+import metrics
+from cart_store import Cart, create_cart_store
+from catalog import MenuCatalog
+from contact_intake import ContactIntake, ContactIntakeFull
+from mongo import (
+    EXISTS_EMAIL_PROJECTION,
+    EXISTS_PHONE_PROJECTION,
+    LOGIN_PROJECTION,
+    ORDER_DETAILS_PROJECTION,
+    ORDER_SUMMARY_PROJECTION,
+    PROFILE_PROJECTION,
+    REVIEW_PROJECTION,
+    MongoConnection,
+    duplicate_key_field,
+    encode_cursor,
+    ensure_indexes,
+    keyset_filter,
+    phone_query,
+)
+from order_queue import IdempotencyKeys, OrderQueue, OrderQueueFull
+from outbox import OUTBOX_COLLECTION, OutboxWorker, create_sender
+from order_stats import get_user_stats, record_order
+from page_cache import LRUCache, PageCache, TTLCache
+from passwords import PasswordHasher
+from ratings import RatingsSnapshot, apply_ratings, load_ratings, record_rating
+
 # Set static_folder and template_folder explicitly for robust path resolution
 app = Flask(__name__, static_folder="static", template_folder="templates")
 app.secret_key = "delicious_roll_secret_2024"
 # Ensure session cookies are set properly for persistence and security
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True if using HTTPS
+# Where carts live: "mongo" (shared by all workers) or "memory" (per-process
+# LRU; single-process dev and tests only)
+app.config['CART_STORE'] = os.environ.get('CART_STORE', 'mongo')
+# Worker processes the server runs (gunicorn reads the same variable)
+app.config['WEB_CONCURRENCY'] = int(os.environ.get('WEB_CONCURRENCY', 1))
+app.config['CART_STORE_MAX_CARTS'] = int(os.environ.get('CART_STORE_MAX_CARTS', 10000))
+# Write-behind order queue (see order_queue.py)
+app.config['ORDER_QUEUE_SIZE'] = int(os.environ.get('ORDER_QUEUE_SIZE', 1000))
+app.config['ORDER_QUEUE_WORKERS'] = int(os.environ.get('ORDER_QUEUE_WORKERS', 2))
+app.config['ORDER_QUEUE_BATCH_SIZE'] = int(os.environ.get('ORDER_QUEUE_BATCH_SIZE', 50))
+app.config['ORDER_QUEUE_SPILL_DIR'] = os.environ.get('ORDER_QUEUE_SPILL_DIR', os.path.join(app.instance_path, 'order-queue'))
+app.config['ORDER_QUEUE_FSYNC'] = os.environ.get('ORDER_QUEUE_FSYNC', '0') == '1'
+# Password hashing (see passwords.py); WORKERS=0 hashes on the request thread
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+# Contact form batching and notification delivery (contact_intake.py, outbox.py)
+app.config['CONTACT_BATCH_SIZE'] = int(os.environ.get('CONTACT_BATCH_SIZE', 50))
+app.config['CONTACT_FLUSH_SECONDS'] = float(os.environ.get('CONTACT_FLUSH_SECONDS', 1.0))
+app.config['NOTIFY_SENDER'] = os.environ.get('NOTIFY_SENDER', 'log')
+app.config['SMTP_HOST'] = os.environ.get('SMTP_HOST', 'localhost')
+app.config['SMTP_PORT'] = int(os.environ.get('SMTP_PORT', 25))
+app.config['SMTP_USERNAME'] = os.environ.get('SMTP_USERNAME')
+app.config['SMTP_PASSWORD'] = os.environ.get('SMTP_PASSWORD')
+app.config['SMTP_STARTTLS'] = os.environ.get('SMTP_STARTTLS', '0') == '1'
+app.config['NOTIFY_FROM'] = os.environ.get('NOTIFY_FROM', 'noreply@rollparadise.example')
+app.config['NOTIFY_TO'] = os.environ.get('NOTIFY_TO', 'admin@example.com')
+# Responsive image helpers for templates (see tools/build_images.py)
+assets.init_app(app)
+logs.init_app(app)
+
+# Request and Mongo timings at /metrics; METRICS_DIR shares them between
+# worker processes (see metrics.py)
+metrics_registry = metrics.Registry(os.environ.get('METRICS_DIR'))
+metrics.init_app(app, metrics_registry)
+
+log = logging.getLogger('app')
+auth_log = logging.getLogger('app.auth')
+# One record per authenticated request; sampled (LOG_SAMPLE) under load
+request_log = logging.getLogger('app.requests')
 
 # Sample menu data with real food descriptions
 MENU_DATA = {
@@ -343,28 +416,205 @@ MENU_DATA = {
     ],
 }
 
+# Indexed view of MENU_DATA used by every route
+catalog = MenuCatalog(MENU_DATA)
+
+# Rendered pages that only depend on the menu, the query string and who is
+# signed in. Keys include catalog.version, so a rebuilt catalog misses.
+page_cache = PageCache(
+    version=lambda: catalog.version,
+    vary=lambda: (session.get('user_email'), session.get('user_name'), session.get('cart_count', 0)),
+    max_entries=int(os.environ.get('PAGE_CACHE_SIZE', 512)),
+)
+metrics_registry.register_cache('pages', page_cache)
+
+
+def reload_catalog():
+    """Rebuild the catalog after MENU_DATA or the live item ratings have changed."""
+    global catalog
+    catalog = MenuCatalog(apply_ratings(MENU_DATA, item_ratings.ratings))
+    page_cache.clear()
+
+
+# Live ratings from reviews, reloaded in the background (never per request);
+# a change rebuilds the catalog, whose new version retires cached pages
+item_ratings = RatingsSnapshot(
+    load=lambda: load_ratings(get_db()),
+    interval=int(os.environ.get('RATINGS_REFRESH_SECONDS', 30)),
+    on_change=lambda ratings: reload_catalog(),
+)
+
 # --- MongoDB Connection Setup ---
 load_dotenv()
-MONGO_URI = os.environ.get('MONGO_URI')
-mongo_client = pymongo.MongoClient(MONGO_URI)
-db = mongo_client['userauth']  # Use the 'userauth' database as shown in your MongoDB
+app.config['MONGO_URI'] = os.environ.get('MONGO_URI')
+app.config['MONGO_DB_NAME'] = os.environ.get('MONGO_DB_NAME', 'userauth')
+app.config['MONGO_MAX_POOL_SIZE'] = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+app.config['MONGO_MIN_POOL_SIZE'] = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+app.config['MONGO_CONNECT_TIMEOUT_MS'] = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000))
+app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+app.config['MONGO_SOCKET_TIMEOUT_MS'] = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 10000))
+
+
+# Signup relies on these to reject duplicates; without them it checks first
+SIGNUP_UNIQUE_INDEXES = {('users', 'email_unique'), ('users', 'phone_unique')}
+signup_indexes_ready = False
+
+
+def ensure_indexes_on_connect(db):
+    global signup_indexes_ready
+    # Indexes for every hot query (no-op when they already exist)
+    try:
+        failed = ensure_indexes(db)
+    except pymongo.errors.PyMongoError as e:
+        log.error("Could not create MongoDB indexes: %s", e)
+        signup_indexes_ready = False
+        return
+    for (collection, name), e in failed.items():
+        log.error("Could not create MongoDB index %s.%s: %s", collection, name, e)
+    signup_indexes_ready = not SIGNUP_UNIQUE_INDEXES & failed.keys()
+
+
+# The client is created by the first get_db() in each process (see mongo.py)
+mongo = MongoConnection(
+    app.config['MONGO_URI'],
+    db_name=app.config['MONGO_DB_NAME'],
+    event_listeners=[metrics.MongoCommandMetrics(metrics_registry).listener()],
+    on_connect=ensure_indexes_on_connect,
+    maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+    minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+    connectTimeoutMS=app.config['MONGO_CONNECT_TIMEOUT_MS'],
+    serverSelectionTimeoutMS=app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+    socketTimeoutMS=app.config['MONGO_SOCKET_TIMEOUT_MS'],
+)
+
 
-# --- User Authentication Helpers ---
 def get_db():
-    return db
+    return mongo.db()
+
+
+# Carts are kept server-side; the session cookie only holds the cart id
+if app.config['CART_STORE'] == 'memory' and app.config['WEB_CONCURRENCY'] > 1:
+    # Each worker would have its own carts; items would vanish between requests
+    raise RuntimeError("CART_STORE=memory keeps carts per process; use CART_STORE=mongo with several workers")
+if app.config['CART_STORE'] == 'memory' and os.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+    # gunicorn -w N does not set WEB_CONCURRENCY, so this is all we can tell
+    log.warning("CART_STORE=memory under gunicorn: carts are lost between workers unless there is only one")
+cart_store = create_cart_store(
+    app.config['CART_STORE'], get_db=get_db, max_carts=app.config['CART_STORE_MAX_CARTS']
+)
+
+
+def record_order_stats(orders):
+    for order in orders:
+        try:
+            record_order(get_db(), order)
+        except Exception as e:
+            # The order is saved; `python order_stats.py backfill` repairs the rollup
+            log.warning("Could not update order stats: %s", e, extra={'user_email': order['user_email']})
+
+
+# Orders are written to Mongo in the background; writer threads start on
+# the first order in each worker process
+order_queue = OrderQueue(
+    get_collection=lambda: get_db()['orders'],
+    spill_dir=app.config['ORDER_QUEUE_SPILL_DIR'],
+    on_written=record_order_stats,
+    max_size=app.config['ORDER_QUEUE_SIZE'],
+    workers=app.config['ORDER_QUEUE_WORKERS'],
+    batch_size=app.config['ORDER_QUEUE_BATCH_SIZE'],
+    fsync=app.config['ORDER_QUEUE_FSYNC'],
+)
+idempotency_keys = IdempotencyKeys(lambda: get_db()['idempotency_keys'])
+
+# Longest accepted contact form fields, in characters
+CONTACT_MAX_LENGTHS = {'name': 100, 'email': 254, 'subject': 200, 'message': 5000}
+# Contact messages are written in batches; notifications go through the outbox
+contact_intake = ContactIntake(
+    get_db,
+    batch_size=app.config['CONTACT_BATCH_SIZE'],
+    flush_interval=app.config['CONTACT_FLUSH_SECONDS'],
+)
+outbox_worker = OutboxWorker(
+    lambda: get_db()[OUTBOX_COLLECTION],
+    create_sender(
+        app.config['NOTIFY_SENDER'],
+        host=app.config['SMTP_HOST'],
+        port=app.config['SMTP_PORT'],
+        from_addr=app.config['NOTIFY_FROM'],
+        to_addr=app.config['NOTIFY_TO'],
+        username=app.config['SMTP_USERNAME'],
+        password=app.config['SMTP_PASSWORD'],
+        starttls=app.config['SMTP_STARTTLS'],
+    ),
+)
 
+# Projected user profiles (PROFILE_PROJECTION, never the password hash) by
+# email. Per process: signup, login and update_profile refresh this worker's
+# entry, other workers see profile edits within the TTL
+user_profile_cache = TTLCache(
+    ttl=int(os.environ.get('USER_PROFILE_CACHE_TTL', 60)),
+    max_entries=int(os.environ.get('USER_PROFILE_CACHE_SIZE', 10000)),
+)
+metrics_registry.register_cache('user_profiles', user_profile_cache)
+# Bumped by every profile write in this process. A read that started before
+# a write must not cache what it read once the write has invalidated it
+user_profile_writes = 0
+user_profile_lock = threading.Lock()
+
+
+def cache_user_profile(email, profile, writes_before_read):
+    """Cache ``profile`` unless a profile write happened since it was read."""
+    with user_profile_lock:
+        if user_profile_writes == writes_before_read:
+            user_profile_cache.set(email, profile)
+
+
+def invalidate_user_profile(email):
+    """Drop the cached profile after a write (call once the write is done)."""
+    global user_profile_writes
+    with user_profile_lock:
+        user_profile_writes += 1
+        user_profile_cache.delete(email)
+
+
+def get_user_profile(email):
+    """The user's profile fields, from the cache while fresh; None for an unknown email."""
+    profile = user_profile_cache.get(email)
+    if profile is None:
+        writes = user_profile_writes
+        profile = get_db()['users'].find_one({'email': email}, PROFILE_PROJECTION)
+        if profile is None:
+            return None
+        cache_user_profile(email, profile, writes)
+    # Callers get their own copy to change
+    return dict(profile)
+
+
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'], workers=app.config['PASSWORD_HASH_WORKERS']
+)
+
+# --- User Authentication Helpers ---
 def check_email_exists(email):
-    return db['users'].find_one({'email': email}) is not None
+    return get_db()['users'].find_one({'email': email}, EXISTS_EMAIL_PROJECTION) is not None
 
 def check_phone_exists(phone):
-    return db['users'].find_one({'phone': phone}) is not None
+    return get_db()['users'].find_one(phone_query(phone), EXISTS_PHONE_PROJECTION) is not None
 
 def signup_user(full_name, email, phone, password):
-    if check_email_exists(email):
-        return {'success': False, 'message': 'Email already exists'}
-    if check_phone_exists(phone):
-        return {'success': False, 'message': 'Phone number already exists'}
-    hashed_pw = generate_password_hash(password)
+    # One insert guarded by the unique email/phone indexes: no separate
+    # existence checks, and no race between checking and inserting.  If
+    # this process could not build those indexes, check first instead.
+    if phone is not None:
+        # Only string phones are in the partial phone_unique index
+        phone = str(phone)
+    db = get_db()
+    if not signup_indexes_ready:
+        if check_email_exists(email):
+            return {'success': False, 'message': 'Email already exists'}
+        if phone and check_phone_exists(phone):
+            return {'success': False, 'message': 'Phone number already exists'}
+    hashed_pw = password_hasher.hash(password)
     user = {
         'email': email,
         'password': hashed_pw,
@@ -373,37 +623,75 @@ def signup_user(full_name, email, phone, password):
         'name': full_name,  # Keep both for compatibility
         'created_at': datetime.now(timezone.utc)
     }
-    db['users'].insert_one(user)
+    try:
+        db['users'].insert_one(user)
+    except pymongo.errors.DuplicateKeyError as e:
+        if duplicate_key_field(e) == 'phone':
+            return {'success': False, 'message': 'Phone number already exists'}
+        return {'success': False, 'message': 'Email already exists'}
+    invalidate_user_profile(email)
     return {'success': True, 'message': 'User registered successfully'}
 
 def login_user(email, password):
-    user = db['users'].find_one({'email': email})
+    users = get_db()['users']
+    profile_writes = user_profile_writes
+    user = users.find_one({'email': email}, LOGIN_PROJECTION)
     if not user:
         return {'success': False, 'message': 'Email not found'}
-    if not check_password_hash(user['password'], password):
+    stored_hash = user.pop('password')
+    if not password_hasher.verify(stored_hash, password):
         return {'success': False, 'message': 'Incorrect password'}
-    # Remove _id to avoid JSON serialization error
-    if '_id' in user:
-        del user['_id']
-    return {'success': True, 'user': user, 'user_name': user.get('full_name', user.get('name', email))}
+    if password_hasher.needs_rehash(stored_hash):
+        # Upgrade hashes made with older settings while we have the password;
+        # matching the old hash avoids overwriting a concurrent password change
+        try:
+            users.update_one(
+                {'email': email, 'password': stored_hash},
+                {'$set': {'password': password_hasher.hash(password)}},
+            )
+        except pymongo.errors.PyMongoError as e:
+            log.warning("Could not rehash password: %s", e, extra={'user_email': email})
+    # The login read already has the profile fields; save checkout a lookup
+    cache_user_profile(email, {field: user[field] for field in PROFILE_PROJECTION if field in user}, profile_writes)
+    public = {field: user[field] for field in ('email', 'full_name', 'name') if field in user}
+    return {'success': True, 'user': public, 'user_name': user.get('full_name', user.get('name', email))}
 
 # Initialize session cart
 def init_cart():
-    if "cart" not in session:
-        session["cart"] = []
-    if "cart_total" not in session:
-        session["cart_total"] = 0.0
+    if "cart_id" not in session:
+        session["cart_id"] = uuid.uuid4().hex
+    # Move carts from older cookies (full cart in the session) into the store
+    if "cart" in session:
+        session.pop("cart_total", None)
+        save_cart(Cart.from_items(session.pop("cart")))
+
+
+def get_cart():
+    """Return this request's cart, loading it from the cart store once."""
+    if "cart" not in g:
+        g.cart = Cart.from_dict(cart_store.load(session["cart_id"]))
+    return g.cart
+
+
+def save_cart(cart):
+    cart_store.save(session["cart_id"], cart.to_dict())
+    # The nav badge in base.html renders from this without loading the cart
+    session["cart_count"] = len(cart)
 
 
 @app.before_request
 def before_request():
+    # Each worker process replays orders spilled by workers that are gone
+    order_queue.start()
+    item_ratings.start()
+    outbox_worker.start()
     init_cart()
 
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        print('DEBUG: login_required - session user_email:', session.get('user_email'))
+        request_log.debug("login_required", extra={'user_email': session.get('user_email'), 'path': request.path})
         if not session.get('user_email'):
             return redirect(url_for('login', next=request.url))
         return f(*args, **kwargs)
@@ -412,33 +700,26 @@ def login_required(f):
 
 # Routes
 @app.route("/")
+@page_cache.cached
 def home():
     # Check if user is logged in (e.g., session['user_email'] exists)
-    return render_template("index.html", featured_rolls=MENU_DATA["featured_rolls"][:4], force_signup_modal=False)
+    return render_template("index.html", featured_rolls=catalog.items("roll")[:4], force_signup_modal=False)
 
 
 @app.route("/menu")
 @login_required
+@page_cache.cached
 def menu():
     category = request.args.get("category", "all")
     search = request.args.get("search", "")
 
-    rolls = MENU_DATA["featured_rolls"]
-    sides = MENU_DATA["sides"]
-    drinks = MENU_DATA["drinks"]
-
-    # Filter by category
-    if category != "all":
-        rolls = [roll for roll in rolls if roll["category"] == category]
-
-    # Filter by search
+    # Filter by search (ranked) and category
     if search:
-        rolls = [
-            roll
-            for roll in rolls
-            if search.lower() in roll["name"].lower()
-            or search.lower() in roll["description"].lower()
-        ]
+        rolls = catalog.search("roll", search, category)
+    else:
+        rolls = catalog.by_category("roll", category)
+    sides = catalog.items("side")
+    drinks = catalog.items("drink")
 
     categories = ["all", "chicken", "beef", "vegetarian", "pork", "seafood"]
 
@@ -455,34 +736,20 @@ def menu():
 
 @app.route("/drinks")
 @login_required
+@page_cache.cached
 def drinks():
     search = request.args.get("search", "")
     category = request.args.get("category", "all")
 
-    drinks = MENU_DATA["drinks"]
-    
-    # Filter by search
+    # Filter by search (ranked) and category
     if search:
-        drinks = [
-            drink
-            for drink in drinks
-            if search.lower() in drink["name"].lower() or search.lower() in drink.get("description", "").lower()
-        ]
-
-    # Filter by category
-    if category != "all":
-        drinks = [drink for drink in drinks if drink.get("category") == category]
-
-    # Get category counts for better UX
-    category_counts = {}
-    all_drinks = MENU_DATA["drinks"]
+        drinks = catalog.search("drink", search, category)
+    else:
+        drinks = catalog.by_category("drink", category)
+
+    # Get category counts for better UX (precomputed by the catalog)
     categories = ["all", "hot", "cold", "smoothies", "coffee", "tea"]
-    
-    for cat in categories:
-        if cat == "all":
-            category_counts[cat] = len(all_drinks)
-        else:
-            category_counts[cat] = len([d for d in all_drinks if d.get("category") == cat])
+    category_counts = catalog.counts("drink", categories)
 
     return render_template(
         "drinks.html",
@@ -620,6 +887,7 @@ def customize():
 
 @app.route("/about")
 @login_required
+@page_cache.cached
 def about():
     team_members = [
         {
@@ -660,10 +928,15 @@ def about():
 
 @app.route("/contact")
 @login_required
+@page_cache.cached
 def contact():
     return render_template("contact.html")
 
 
+# Orders listed on the profile page
+PROFILE_RECENT_ORDERS = 5
+
+
 @app.route("/profile")
 def profile():
     # Check if user is logged in
@@ -674,47 +947,38 @@ def profile():
     try:
         user_email = session['user_email']
         
-        # Get user info from database
-        db = get_db()
-        users_collection = db['users']
-        user = users_collection.find_one({'email': user_email})
+        user = get_user_profile(user_email)
         
         if not user:
             return redirect(url_for('home'))
         
-        # Convert ObjectId to string for JSON serialization
-        if '_id' in user:
-            user['_id'] = str(user['_id'])
-        
-        # Get user's orders
+        # Get user's most recent orders only
+        db = get_db()
         orders_collection = db['orders']
-        orders = list(orders_collection.find({'user_email': user_email}).sort('order_date', -1))
+        orders = list(orders_collection.find(
+            {'user_email': user_email}, ORDER_SUMMARY_PROJECTION
+        ).sort('order_date', -1).limit(PROFILE_RECENT_ORDERS))
         
-        # Convert ObjectIds to strings for JSON serialization
-        for order in orders:
-            if '_id' in order:
-                order['_id'] = str(order['_id'])
-        
-        # Calculate basic statistics
-        total_orders = len(orders)
-        total_spent = sum(order.get('total_amount', 0) for order in orders)
+        # Statistics come from the rollup place_order maintains
+        stats = get_user_stats(db, user_email)
         
         return render_template('profile.html', 
                              user=user, 
                              orders=orders, 
-                             total_orders=total_orders, 
-                             total_spent=total_spent)
+                             total_orders=stats['order_count'], 
+                             total_spent=stats['total_spent'],
+                             last_order_date=stats['last_order_date'],
+                             favourite_items=stats['favourite_items'])
     except Exception as e:
-        print(f"Error in profile route: {str(e)}")
+        log.exception("Error in profile route")
         return redirect(url_for('home'))
 
 
 @app.route("/cart")
 @login_required
 def cart():
-    cart_items = session.get("cart", [])
-    total = session.get("cart_total", 0.0)
-    return render_template("cart.html", cart_items=cart_items, total=total)
+    cart = get_cart()
+    return render_template("cart.html", cart_items=cart.items(), total=cart.total)
 
 
 @app.route("/login")
@@ -731,6 +995,40 @@ def signin():
     return render_template("signin.html")
 
 
+def make_cart_item(item_id, item_type, quantity):
+    """Build a cart line for a catalog item; returns (cart_item, error_message)."""
+    # Convert item_id to int for comparison with menu data
+    try:
+        item_id_int = int(item_id)
+    except (ValueError, TypeError):
+        return None, "Invalid item ID"
+
+    # Find the item in the catalog
+    item = catalog.get(item_type, item_id_int)
+
+    if not item:
+        return None, "Item not found"
+
+    if isinstance(quantity, bool):
+        return None, "Invalid quantity"
+    try:
+        quantity = int(quantity)
+    except (ValueError, TypeError):
+        return None, "Invalid quantity"
+    if quantity < 1:
+        return None, "Invalid quantity"
+
+    return {
+        "id": str(uuid.uuid4()),
+        "item_id": item_id_int,
+        "name": item["name"],
+        "price": item["price"],
+        "quantity": quantity,
+        "type": item_type,
+        "image": item.get("image", ""),
+    }, None
+
+
 # API Routes
 @app.route("/api/add_to_cart", methods=["POST"])
 @login_required
@@ -741,54 +1039,21 @@ def add_to_cart():
         item_type = data.get("type", "roll")
         quantity = data.get("quantity", 1)
 
-        # Convert item_id to int for comparison with menu data
-        try:
-            item_id_int = int(item_id)
-        except (ValueError, TypeError):
-            return jsonify({"success": False, "message": "Invalid item ID"})
-
-        # Find the item in menu data
-        item = None
-        if item_type == "roll":
-            item = next(
-                (roll for roll in MENU_DATA["featured_rolls"] if roll["id"] == item_id_int),
-                None,
-            )
-        elif item_type == "side":
-            item = next(
-                (side for side in MENU_DATA["sides"] if side["id"] == item_id_int), None
-            )
-        elif item_type == "drink":
-            item = next(
-                (drink for drink in MENU_DATA["drinks"] if drink["id"] == item_id_int), None
-            )
+        cart_item, error = make_cart_item(item_id, item_type, quantity)
+        if error:
+            return jsonify({"success": False, "message": error})
 
-        if not item:
-            return jsonify({"success": False, "message": "Item not found"})
-
-        # Add to cart
-        cart_item = {
-            "id": str(uuid.uuid4()),
-            "item_id": item_id_int,
-            "name": item["name"],
-            "price": item["price"],
-            "quantity": quantity,
-            "type": item_type,
-            "image": item.get("image", ""),
-        }
-
-        session["cart"].append(cart_item)
-        session["cart_total"] = sum(
-            item["price"] * item["quantity"] for item in session["cart"]
-        )
-        session.modified = True
+        # Add to cart (merged into the existing line for the same item)
+        cart = get_cart()
+        cart.add(cart_item)
+        save_cart(cart)
 
         return jsonify(
             {
                 "success": True,
-                "message": f'{item["name"]} added to cart! 🛒',
-                "cart_count": len(session["cart"]),
-                "cart_total": session["cart_total"],
+                "message": f'{cart_item["name"]} added to cart! 🛒',
+                "cart_count": len(cart),
+                "cart_total": cart.total,
             }
         )
 
@@ -804,34 +1069,20 @@ def update_cart_qty():
         item_id = data.get("id")
         delta = data.get("delta", 0)
         
-        cart = session.get("cart", [])
-        
-        # Find the item in cart
-        cart_item = next((item for item in cart if item["id"] == item_id), None)
+        cart = get_cart()
         
-        if not cart_item:
+        if item_id not in cart:
             return jsonify({"success": False, "message": "Item not found in cart"})
         
-        # Update quantity
-        new_quantity = cart_item["quantity"] + delta
-        
-        if new_quantity <= 0:
-            # Remove item if quantity becomes 0 or negative
-            cart.remove(cart_item)
-        else:
-            cart_item["quantity"] = new_quantity
-        
-        # Update cart total
-        session["cart_total"] = sum(
-            item["price"] * item["quantity"] for item in cart
-        )
-        session.modified = True
+        # Update quantity (the line is removed if it drops to 0 or below)
+        cart.update_quantity(item_id, delta)
+        save_cart(cart)
         
         return jsonify({
             "success": True,
             "message": "Cart updated successfully",
             "cart_count": len(cart),
-            "cart_total": session["cart_total"]
+            "cart_total": cart.total
         })
         
     except Exception as e:
@@ -845,27 +1096,19 @@ def remove_cart_item():
         data = request.get_json()
         item_id = data.get("id")
         
-        cart = session.get("cart", [])
-        
-        # Find and remove the item
-        cart_item = next((item for item in cart if item["id"] == item_id), None)
+        cart = get_cart()
         
-        if not cart_item:
+        if item_id not in cart:
             return jsonify({"success": False, "message": "Item not found in cart"})
         
-        cart.remove(cart_item)
-        
-        # Update cart total
-        session["cart_total"] = sum(
-            item["price"] * item["quantity"] for item in cart
-        )
-        session.modified = True
+        cart.remove(item_id)
+        save_cart(cart)
         
         return jsonify({
             "success": True,
             "message": "Item removed from cart",
             "cart_count": len(cart),
-            "cart_total": session["cart_total"]
+            "cart_total": cart.total
         })
         
     except Exception as e:
@@ -898,18 +1141,16 @@ def add_custom_roll():
             "custom": True,
         }
 
-        session["cart"].append(cart_item)
-        session["cart_total"] = sum(
-            item["price"] * item["quantity"] for item in session["cart"]
-        )
-        session.modified = True
+        cart = get_cart()
+        cart.add(cart_item)
+        save_cart(cart)
 
         return jsonify(
             {
                 "success": True,
                 "message": f"{name} added to cart! 🌯",
-                "cart_count": len(session["cart"]),
-                "cart_total": session["cart_total"],
+                "cart_count": len(cart),
+                "cart_total": cart.total,
             }
         )
 
@@ -920,16 +1161,78 @@ def add_custom_roll():
 @app.route("/api/get_cart_info")
 @login_required
 def get_cart_info():
-    cart = session.get("cart", [])
-    cart_total = session.get("cart_total", 0.0)
+    cart = get_cart()
     return jsonify({
         "success": True,
-        "cart": cart,
+        "cart": cart.items(),
         "cart_count": len(cart),
-        "cart_total": cart_total,
+        "cart_total": cart.total,
     })
 
 
+# Upper bound on operations accepted by one /api/cart/batch request
+MAX_CART_BATCH_OPS = 100
+
+
+@app.route("/api/cart/batch", methods=["POST"])
+@login_required
+def cart_batch():
+    """Apply several cart operations with a single cart store write.
+
+    Body: {"ops": [{"op": "add", "id": <menu id>, "type": "roll", "quantity": 1},
+                   {"op": "update", "id": <line id>, "delta": -1},
+                   {"op": "update", "id": <line id>, "quantity": 3},
+                   {"op": "remove", "id": <line id>}]}
+    Operations run in order; a failing one is reported in "results" and
+    does not stop the rest.
+    """
+    try:
+        data = request.get_json()
+        ops = data.get("ops", [])
+        if not isinstance(ops, list) or not ops:
+            return jsonify({"success": False, "message": "No cart operations given"})
+        if len(ops) > MAX_CART_BATCH_OPS:
+            return jsonify({"success": False, "message": f"At most {MAX_CART_BATCH_OPS} operations per batch"})
+
+        cart = get_cart()
+        results = []
+        for op in ops:
+            kind = op.get("op")
+            line_id = op.get("id")
+            if kind == "add":
+                cart_item, error = make_cart_item(line_id, op.get("type", "roll"), op.get("quantity", 1))
+                if error:
+                    results.append({"success": False, "message": error})
+                    continue
+                line = cart.add(cart_item)
+                results.append({"success": True, "id": line["id"] if line else None})
+            elif kind in ("update", "remove"):
+                if line_id not in cart:
+                    results.append({"success": False, "message": "Item not found in cart"})
+                    continue
+                if kind == "remove":
+                    cart.remove(line_id)
+                elif "quantity" in op:
+                    cart.set_quantity(line_id, op["quantity"])
+                else:
+                    cart.update_quantity(line_id, op.get("delta", 0))
+                results.append({"success": True, "id": line_id})
+            else:
+                results.append({"success": False, "message": f"Unknown operation: {kind}"})
+        save_cart(cart)
+
+        return jsonify({
+            "success": True,
+            "results": results,
+            "cart": cart.items(),
+            "cart_count": len(cart),
+            "cart_total": cart.total,
+        })
+
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)})
+
+
 @app.route("/api/signup", methods=["POST"])
 def api_signup():
     data = request.get_json()
@@ -978,31 +1281,36 @@ def api_login():
         data = request.get_json()
         email = data.get("email")
         password = data.get("password")
-        print(f"DEBUG: /api/login - received email: {email}, password: {password}")
         result = login_user(email, password)
-        print(f"DEBUG: /api/login - login_user result: {result}")
         # If login successful, set session data
         if result["success"]:
             session["user_email"] = email
             session["user_name"] = result.get("user_name", email)
-            print('DEBUG: /api/login - session set for', email)
+            auth_log.info("Login succeeded", extra={'user_email': email})
         else:
-            print('DEBUG: /api/login - login failed for', email)
+            auth_log.info("Login failed: %s", result['message'], extra={'user_email': email})
         return jsonify(result)
     except Exception as e:
-        print(f"DEBUG: /api/login - Exception: {e}")
+        auth_log.exception("Login error")
         return jsonify({"success": False, "message": f"Error: {str(e)}"})
 
 
+def clear_session():
+    """Log out: drop the server-side cart along with the session."""
+    if "cart_id" in session:
+        cart_store.delete(session["cart_id"])
+    session.clear()
+
+
 @app.route("/api/logout", methods=["POST"])
 def api_logout():
-    session.clear()
+    clear_session()
     return jsonify({"success": True, "message": "Logged out successfully"})
 
 
 @app.route("/logout", methods=['POST'])
 def logout():
-    session.clear()
+    clear_session()
     return '', 204  # No Content, JS will redirect
 
 
@@ -1029,9 +1337,28 @@ def submit_review():
         title = data.get('title', '')
         text = data.get('text')
         customer_title = data.get('customerTitle', '')
+        # Optional: the menu item being reviewed
+        item_id = data.get('item_id')
+        item_type = data.get('item_type', 'roll')
         
         if not rating or not text:
             return jsonify({'success': False, 'message': 'Rating and review text are required'})
+        try:
+            rating = int(rating)
+        except (TypeError, ValueError):
+            rating = 0
+        if not 1 <= rating <= 5:
+            return jsonify({'success': False, 'message': 'Rating must be between 1 and 5'})
+        if item_id is not None:
+            # Same ids as the catalog and the rating rollups: '3' is 3; 1.0 and True are not ids
+            try:
+                if isinstance(item_id, (bool, float)):
+                    raise TypeError(item_id)
+                item_id = int(item_id)
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'message': 'Invalid item ID'})
+            if not catalog.get(item_type, item_id):
+                return jsonify({'success': False, 'message': 'Item not found'})
         
         # Get user info from session
         user_email = session['user_email']
@@ -1047,17 +1374,28 @@ def submit_review():
             'user_name': user_name,
             'user_avatar': avatar_url,
             'customer_title': customer_title,
-            'rating': int(rating),
+            'rating': rating,
             'title': title,
             'text': text,
             'date': datetime.now(timezone.utc),
             'approved': True  # Auto-approve for now
         }
+        if item_id is not None:
+            review['item_id'] = item_id
+            review['item_type'] = item_type
         
         # Save to database
         db = get_db()
         reviews_collection = db['reviews']
         reviews_collection.insert_one(review)
+        # The new review belongs on the first page
+        reviews_cache.clear()
+        if item_id is not None:
+            try:
+                record_rating(db, item_type, item_id, rating)
+            except pymongo.errors.PyMongoError as e:
+                # The review is saved; `python ratings.py backfill` repairs the rollup
+                log.warning("Could not update item rating: %s", e, extra={'item': f"{item_type}:{item_id}"})
         
         return jsonify({
             'success': True, 
@@ -1076,14 +1414,61 @@ def submit_review():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error submitting review: {str(e)}'})
 
+# Page sizes for /api/reviews
+REVIEWS_PAGE_SIZE = 10
+REVIEWS_PAGE_MAX = 50
+# First pages of reviews, by limit. submit_review clears this worker's
+# copy; other workers, and edits made directly in the database, show up
+# within the TTL
+reviews_cache = TTLCache(ttl=int(os.environ.get('REVIEWS_CACHE_TTL', 60)), max_entries=16)
+metrics_registry.register_cache('reviews', reviews_cache)
+
+
+def load_reviews_page(limit, cursor=None):
+    """One page of approved reviews, newest first; raises ValueError for a bad cursor."""
+    query = keyset_filter({'approved': True}, 'date', cursor)
+    reviews = list(
+        get_db()['reviews'].find(query, REVIEW_PROJECTION)
+        .sort([('date', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)])
+        .limit(limit + 1)
+    )
+    next_cursor = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        next_cursor = encode_cursor(reviews[-1]['date'], reviews[-1]['_id'])
+    for review in reviews:
+        del review['_id']
+        review['date'] = review['date'].isoformat()
+    return {'reviews': reviews, 'next_cursor': next_cursor}
+
+
 @app.route("/api/reviews", methods=['GET'])
 def get_reviews():
-    # Example: reviews = db.get_all_reviews()
-    reviews = [
-        {'rating': 5, 'title': 'Great!', 'text': 'Loved it!', 'customerTitle': 'Foodie'},
-        # ... more reviews ...
-    ]
-    return jsonify({'reviews': reviews})
+    """Approved reviews, newest first, one page at a time.
+
+    Query args: limit (default 10, max 50) and cursor, the next_cursor
+    returned with the previous page. The first page is served from
+    reviews_cache.
+    """
+    try:
+        try:
+            limit = min(max(int(request.args.get('limit', REVIEWS_PAGE_SIZE)), 1), REVIEWS_PAGE_MAX)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid limit'})
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                page = load_reviews_page(limit, cursor)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)})
+        else:
+            page = reviews_cache.get(limit)
+            if page is None:
+                page = load_reviews_page(limit)
+                reviews_cache.set(limit, page)
+        return jsonify({'success': True, **page})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error fetching reviews: {str(e)}'})
 
 @app.route("/api/get-user-info")
 @login_required
@@ -1120,6 +1505,11 @@ def submit_contact():
         
         if not all([name, email, subject, message]):
             return jsonify({'success': False, 'message': 'All fields are required'})
+        for field, value in (('name', name), ('email', email), ('subject', subject), ('message', message)):
+            if not isinstance(value, str):
+                return jsonify({'success': False, 'message': f'Invalid {field}'})
+            if len(value) > CONTACT_MAX_LENGTHS[field]:
+                return jsonify({'success': False, 'message': f'The {field} is too long'})
         
         # Get user info from session
         user_email = session['user_email']
@@ -1137,14 +1527,11 @@ def submit_contact():
             'status': 'new'
         }
         
-        # Save to database
-        db = get_db()
-        contact_collection = db['contact_messages']
-        contact_collection.insert_one(contact_message)
-        
-        # In a real application, you would send an email notification here
-        # For now, we'll just log it
-        print(f"New contact message from {name} ({email}): {subject}")
+        # Stored by the intake's next batch; the outbox sends the notification
+        try:
+            contact_intake.submit(contact_message)
+        except ContactIntakeFull:
+            return jsonify({'success': False, 'message': 'We are receiving a lot of messages, please try again shortly.'}), 503
         
         return jsonify({
             'success': True, 
@@ -1176,9 +1563,9 @@ def update_profile():
         users_collection = db['users']
         
         existing_user = users_collection.find_one({
-            'phone': phone_clean,
+            **phone_query(phone_clean),
             'email': {'$ne': user_email}
-        })
+        }, {'_id': 1})
         
         if existing_user:
             return jsonify({'success': False, 'message': 'This phone number is already registered by another user'})
@@ -1193,6 +1580,7 @@ def update_profile():
                 }
             }
         )
+        invalidate_user_profile(user_email)
         
         if result.modified_count > 0:
             # Update session
@@ -1209,9 +1597,29 @@ def update_profile():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error updating profile: {str(e)}'})
 
+# Rendered order-details fragments, keyed by (order_id, status, updated_at)
+order_fragment_cache = LRUCache(max_entries=int(os.environ.get('ORDER_FRAGMENT_CACHE_SIZE', 1024)))
+metrics_registry.register_cache('order_fragments', order_fragment_cache)
+
+
+def render_order_details(order):
+    """Render the order details fragment with the precompiled Jinja macro."""
+    macro = app.jinja_env.get_template('_order_details.html').module.order_details
+    return str(macro(order))
+
+
+def order_to_json(order):
+    """Order document with datetimes as ISO strings, for the JSON response."""
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in order.items()
+    }
+
+
 @app.route("/api/order_details/<order_id>")
 @login_required
 def order_details(order_id):
+    """Order details as an HTML fragment, or the order itself with ?format=json."""
     try:
         user_email = session['user_email']
         
@@ -1221,64 +1629,20 @@ def order_details(order_id):
         order = orders_collection.find_one({
             'order_id': order_id,
             'user_email': user_email
-        })
+        }, ORDER_DETAILS_PROJECTION)
         
         if not order:
             return jsonify({'success': False, 'message': 'Order not found'})
         
-        # Generate HTML for order details
-        html = f"""
-        <div class="order-details-content">
-            <div class="order-header-details">
-                <div class="order-info-details">
-                    <h3>Order #{order['order_id']}</h3>
-                    <p class="order-date-details">{order['order_date'].strftime('%B %d, %Y at %I:%M %p')}</p>
-                    <span class="status-badge status-{order['status']}">{order['status'].title()}</span>
-                </div>
-            </div>
-            
-            <div class="order-items-details">
-                <h4>Order Items</h4>
-                <div class="items-list">
-        """
+        if request.args.get('format') == 'json':
+            return jsonify({'success': True, 'order': order_to_json(order)})
         
-        for item in order['items']:
-            html += f"""
-                    <div class="item-detail">
-                        <div class="item-info">
-                            <span class="item-name-detail">{item['name']}</span>
-                            <span class="item-quantity-detail">x{item['quantity']}</span>
-                        </div>
-                        <span class="item-price-detail">₹{item['price'] * item['quantity']:.2f}</span>
-                    </div>
-            """
-        
-        html += f"""
-                </div>
-            </div>
-            
-            <div class="order-summary-details">
-                <div class="summary-item">
-                    <span>Subtotal:</span>
-                    <span>₹{order['subtotal']:.2f}</span>
-                </div>
-                <div class="summary-item">
-                    <span>Delivery Fee:</span>
-                    <span>₹{order['delivery_fee']:.2f}</span>
-                </div>
-                <div class="summary-item total">
-                    <span>Total:</span>
-                    <span>₹{order['total']:.2f}</span>
-                </div>
-            </div>
-            
-            <div class="delivery-info-details">
-                <h4>Delivery Information</h4>
-                <p><strong>Estimated Delivery:</strong> {order['estimated_delivery'].strftime('%B %d, %Y at %I:%M %p')}</p>
-                <p><strong>Phone:</strong> {order['phone_number']}</p>
-            </div>
-        </div>
-        """
+        # Re-render only when the order's status or update time changed
+        key = (order['order_id'], order.get('status'), order.get('updated_at'))
+        html = order_fragment_cache.get(key)
+        if html is None:
+            html = render_order_details(order)
+            order_fragment_cache.set(key, html)
         
         return jsonify({
             'success': True,
@@ -1288,25 +1652,68 @@ def order_details(order_id):
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error loading order details: {str(e)}'})
 
+MAX_ORDER_ITEMS = 100
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def clean_order(items, total):
+    """Validate a checkout payload; returns (items, total, error_message).
+
+    Orders are written after the response is sent, so anything stored has
+    to be checked here: a list of {name, quantity >= 1, price >= 0} lines
+    and a numeric total.
+    """
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_ORDER_ITEMS:
+        return None, None, 'Invalid order items'
+    cleaned = []
+    for item in items:
+        if not isinstance(item, dict):
+            return None, None, 'Invalid order items'
+        name, quantity, price = item.get('name'), item.get('quantity'), item.get('price')
+        if not isinstance(name, str) or not name.strip() or len(name) > 200:
+            return None, None, 'Invalid item name'
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            return None, None, 'Invalid item quantity'
+        if not _is_number(price) or price < 0:
+            return None, None, 'Invalid item price'
+        cleaned.append({'name': name, 'quantity': quantity, 'price': price})
+    if not _is_number(total) or total < 0:
+        return None, None, 'Invalid order total'
+    return cleaned, total, None
+
+
 @app.route("/api/place_order", methods=["POST"])
 @login_required
 def place_order():
     try:
         data = request.get_json()
-        total = data.get('total')
-        items = data.get('items', [])
-        if not items:
+        if not data or not data.get('items'):
             return jsonify({'success': False, 'message': 'Cart is empty'})
-        # Get user info from session and database
+        items, total, error = clean_order(data.get('items'), data.get('total'))
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+        # Get user info from session and the profile cache
         user_email = session['user_email']
         user_name = session.get('user_name', 'User')
         db = get_db()
-        users_collection = db['users']
-        user = users_collection.find_one({'email': user_email})
+        user = get_user_profile(user_email)
         if not user or not user.get('phone'):
             return jsonify({'success': False, 'message': 'User info incomplete.'}), 400
         # Generate unique order ID
         order_id = f"RP{datetime.now().strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:8].upper()}"
+        # A retried checkout with the same Idempotency-Key gets the first order back
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()[:200]
+        if idempotency_key:
+            existing_order_id = idempotency_keys.claim(user_email, idempotency_key, order_id)
+            if existing_order_id:
+                return jsonify({
+                    'success': True,
+                    'message': 'Order placed successfully!',
+                    'order_id': existing_order_id
+                })
         # Create order document
         order = {
             'order_id': order_id,
@@ -1318,13 +1725,25 @@ def place_order():
             'order_date': datetime.now(timezone.utc),
             'estimated_delivery': datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(minutes=45)
         }
-        # Save order to database
-        orders_collection = db['orders']
-        orders_collection.insert_one(order)
+        if idempotency_key:
+            order['idempotency_key'] = idempotency_key
+        # Queue the order for the background writers; when the queue is
+        # full, write it here so a backlog slows checkout instead of failing it
+        try:
+            try:
+                order_queue.submit(order)
+            except OrderQueueFull:
+                db['orders'].insert_one(dict(order))
+                record_order_stats([order])
+        except Exception:
+            # Nothing was stored: a retry with the same key must not find this order_id
+            if idempotency_key:
+                idempotency_keys.release(user_email, idempotency_key, order_id)
+            raise
         # Clear cart after successful order
-        session['cart'] = []
-        session['cart_total'] = 0.0
-        session.modified = True
+        cart_store.delete(session['cart_id'])
+        g.pop('cart', None)
+        session['cart_count'] = 0
         return jsonify({
             'success': True,
             'message': 'Order placed successfully!',
@@ -1338,39 +1757,169 @@ def test_modal():
     """Test page for the login modal"""
     return send_from_directory('.', 'test_modal.html')
 
+# Page sizes for /api/get-orders
+ORDERS_PAGE_SIZE = 20
+ORDERS_PAGE_MAX = 100
+
+
 @app.route("/api/get-orders")
 @login_required
 def get_orders():
+    """Newest orders first, one page at a time.
+
+    Query args: limit (default 20, max 100) and cursor, the next_cursor
+    returned with the previous page. Sorting and paging run in Mongo on
+    the (order_date, _id) indexes.
+    """
     try:
         user_email = session['user_email']
         is_admin = user_email == 'admin@example.com'
         show_all = is_admin and request.args.get('all') == '1'
-        db = get_db()
-        orders_collection = db['orders']
+        try:
+            limit = min(max(int(request.args.get('limit', ORDERS_PAGE_SIZE)), 1), ORDERS_PAGE_MAX)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid limit'})
         if show_all:
-            # Admin: get all orders, include user_name and user_email
-            orders = list(orders_collection.find({}, {'_id': 0}))
+            # Admin: all orders, include user_name and user_email
+            query, projection = {}, None
         else:
             # Regular user: only their orders
-            orders = list(orders_collection.find(
-                {'user_email': user_email},
-                {'_id': 0, 'user_email': 0}
-            ))
-        orders.sort(key=lambda o: o.get('order_date', ''), reverse=True)
-        # Convert datetime objects to strings
+            query, projection = {'user_email': user_email}, {'user_email': 0}
+        try:
+            query = keyset_filter(query, 'order_date', request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        db = get_db()
+        orders_collection = db['orders']
+        # One extra document tells us whether there is another page
+        orders = list(
+            orders_collection.find(query, projection)
+            .sort([('order_date', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)])
+            .limit(limit + 1)
+        )
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1]['order_date'], orders[-1]['_id'])
         for order in orders:
+            del order['_id']
+            # Convert datetime objects to strings
             if 'order_date' in order:
                 order['order_date'] = order['order_date'].isoformat()
             if 'estimated_delivery' in order:
                 order['estimated_delivery'] = order['estimated_delivery'].isoformat()
-        for order in orders:
             if "location" not in order:
                 # Set a default or fetch from your order data
                 order["location"] = {"lat": 28.6139, "lng": 77.2090}
-        return jsonify({'success': True, 'orders': orders})
+        return jsonify({'success': True, 'orders': orders, 'next_cursor': next_cursor})
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error fetching orders: {str(e)}'})
 
+# Orders fetched per round trip by the streaming export
+EXPORT_BATCH_SIZE = 500
+# Flush the export to the client once this much text is buffered
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_CSV_FIELDS = [
+    'order_id', 'order_date', 'user_email', 'user_name', 'status', 'total',
+    'item_count', 'items', 'estimated_delivery',
+]
+
+
+def _export_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Invalid {name} date, expected YYYY-MM-DD')
+
+
+def _export_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _export_csv_row(order):
+    items = order.get('items') or []
+    return [
+        order.get('order_id'),
+        order['order_date'].isoformat() if order.get('order_date') else '',
+        order.get('user_email'),
+        order.get('user_name'),
+        order.get('status'),
+        order.get('total'),
+        sum(int(item.get('quantity', 1)) for item in items),
+        '; '.join(f"{item.get('name')} x{item.get('quantity', 1)}" for item in items),
+        order['estimated_delivery'].isoformat() if order.get('estimated_delivery') else '',
+    ]
+
+
+def stream_orders_export(cursor, fmt):
+    """Yield the export in chunks, holding one cursor batch in memory at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    try:
+        if writer:
+            writer.writerow(EXPORT_CSV_FIELDS)
+        for order in cursor:
+            if writer:
+                writer.writerow(_export_csv_row(order))
+            else:
+                buffer.write(json.dumps(order, default=_export_json))
+                buffer.write('\n')
+            if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        # Also runs when the client disconnects mid-download
+        cursor.close()
+
+
+@app.route("/api/admin/orders/export")
+@login_required
+def export_orders():
+    """Stream every order (oldest first) as NDJSON or CSV, for admins.
+
+    Query args: format=ndjson|csv, from=YYYY-MM-DD (inclusive) and
+    to=YYYY-MM-DD (inclusive) on order_date.
+    """
+    if session['user_email'] != 'admin@example.com':
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'success': False, 'message': 'format must be ndjson or csv'}), 400
+    try:
+        date_from = _export_date(request.args.get('from'), 'from')
+        date_to = _export_date(request.args.get('to'), 'to')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    query = {}
+    if date_from or date_to:
+        query['order_date'] = {}
+        if date_from:
+            query['order_date']['$gte'] = date_from
+        if date_to:
+            query['order_date']['$lt'] = date_to + timedelta(days=1)
+    cursor = (
+        get_db()['orders']
+        .find(query, {'_id': 0})
+        .sort('order_date', pymongo.ASCENDING)
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"orders-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}.{fmt}"
+    return Response(
+        stream_orders_export(cursor, fmt),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
+    )
+
+
 @app.route("/orders")
 @login_required
 def orders():
@@ -1378,6 +1927,17 @@ def orders():
     is_admin = user_email == 'admin@example.com'
     return render_template("orders.html", is_admin=is_admin)
 
+
+@app.route("/healthz")
+def healthz():
+    """Liveness plus this process's Mongo connection pool counters."""
+    status = {'pid': os.getpid(), 'order_queue': order_queue.qsize()}
+    try:
+        status.update(mongo.health())
+    except pymongo.errors.PyMongoError as e:
+        return jsonify({**status, 'status': 'error', 'message': str(e)}), 503
+    return jsonify({**status, 'status': 'ok'})
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
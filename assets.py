@@ -0,0 +1,171 @@
+"""Static asset serving: responsive images, precompression and cache headers.
+
+``tools/build_images.py`` writes resized, content-hashed image variants to
+static/build/images along with a manifest.  ``responsive_image`` looks an
+original URL such as ``/static/images/R1.jpg`` up in that manifest and emits
+a ``<picture>`` with AVIF/WebP ``srcset`` sources; images that were not
+built (remote URLs, or no build has run yet) get a plain ``<img>``.
+
+``StaticFiles`` replaces Flask's static view.  When ``tools/compress_static.py``
+has written ``.br``/``.gz`` siblings it serves the best one the browser
+accepts, with ``Content-Encoding`` and ``Vary: Accept-Encoding``.  Built
+images have the content hash in their name and ``url_for('static', ...)``
+appends a ``?v=<hash>`` of the file, so both are served with a one-year
+immutable Cache-Control; anything else keeps Flask's revalidating default.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_from_directory
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+# Precompressed siblings, in order of preference on equal quality
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class ImageManifest:
+    def __init__(self, path):
+        self.path = path
+        self.entries = load_manifest(path)
+
+    def lookup(self, src):
+        return self.entries.get(src)
+
+    def srcset(self, src, fmt="webp"):
+        """``srcset`` value for ``src`` in ``fmt``, or "" if it was not built."""
+        entry = self.lookup(src)
+        if not entry or fmt not in entry["variants"]:
+            return ""
+        return ", ".join(f"{v['url']} {v['width']}w" for v in entry["variants"][fmt])
+
+    def url(self, src, width, fmt="webp"):
+        """URL of the smallest built variant at least ``width`` px wide."""
+        entry = self.lookup(src)
+        if not entry or fmt not in entry["variants"]:
+            return src
+        variants = entry["variants"][fmt]
+        return next((v["url"] for v in variants if v["width"] >= width), variants[-1]["url"])
+
+    def responsive_image(self, src, alt="", sizes="100vw", css_class=None, lazy=True, **attrs):
+        """Render an image for ``src`` using its built variants when available."""
+        attrs = {"alt": alt, "class": css_class, **attrs}
+        if lazy:
+            attrs.setdefault("loading", "lazy")
+            attrs.setdefault("decoding", "async")
+        entry = self.lookup(src)
+        if not entry:
+            return Markup(f"<img src=\"{escape(src)}\"{_attributes(attrs)}>")
+        fallback = entry["fallback"]
+        attrs.update(width=fallback["width"], height=fallback["height"])
+        sources = "".join(
+            f"<source type=\"{MIME_TYPES[fmt]}\" srcset=\"{escape(self.srcset(src, fmt))}\" sizes=\"{escape(sizes)}\">"
+            for fmt in ("avif", "webp")
+            if fmt in entry["variants"]
+        )
+        # display:contents keeps the <img> laid out exactly as before
+        return Markup(
+            f"<picture style=\"display:contents\">{sources}"
+            f"<img src=\"{escape(fallback['url'])}\"{_attributes(attrs)}></picture>"
+        )
+
+
+def _attributes(attrs):
+    return "".join(
+        f" {escape(name.replace('_', '-'))}=\"{escape(value)}\""
+        for name, value in attrs.items()
+        if value is not None
+    )
+
+
+class StaticFiles:
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        # filename -> (mtime_ns, size, content hash)
+        self._versions = {}
+
+    def version(self, filename):
+        """Short content hash of a static file, or None if it does not exist."""
+        path = safe_join(self.static_folder, filename)
+        try:
+            stat = os.stat(path)
+        except (TypeError, OSError):
+            return None
+        cached = self._versions.get(filename)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        self._versions[filename] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def encodings(self, path):
+        """Precompressed siblings of ``path`` that are not older than it."""
+        source_mtime = os.stat(path).st_mtime_ns
+        available = []
+        for encoding, suffix in ENCODINGS:
+            try:
+                if os.stat(path + suffix).st_mtime_ns >= source_mtime:
+                    available.append((encoding, suffix))
+            except OSError:
+                continue
+        return available
+
+    def serve(self, filename):
+        path = safe_join(self.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        available = self.encodings(path)
+        best = None
+        for encoding, suffix in available:
+            quality = request.accept_encodings[encoding]
+            if quality and (best is None or quality > best[0]):
+                best = (quality, encoding, suffix)
+        if best:
+            mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            response = send_from_directory(self.static_folder, filename + best[2], mimetype=mimetype)
+            response.headers["Content-Encoding"] = best[1]
+        else:
+            response = send_from_directory(self.static_folder, filename)
+        if available:
+            response.vary.add("Accept-Encoding")
+        if response.status_code in (200, 206, 304) and (
+            filename.startswith("build/") or request.args.get("v") == self.version(filename)
+        ):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def init_app(app, manifest_path=None):
+    """Register the image helpers and the static file view on ``app``."""
+    if manifest_path is None:
+        manifest_path = os.path.join(app.static_folder, "build", "images", "manifest.json")
+    manifest = ImageManifest(manifest_path)
+    app.jinja_env.globals["responsive_image"] = manifest.responsive_image
+    app.jinja_env.globals["image_srcset"] = manifest.srcset
+    app.jinja_env.globals["image_url"] = manifest.url
+
+    static_files = StaticFiles(app.static_folder)
+    app.view_functions["static"] = static_files.serve
+
+    @app.url_defaults
+    def add_static_version(endpoint, values):
+        # Cache-busting query so versioned URLs can be cached for a year
+        if endpoint == "static" and "v" not in values:
+            version = static_files.version(values.get("filename", ""))
+            if version:
+                values["v"] = version
+
+    return manifest
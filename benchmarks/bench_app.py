@@ -0,0 +1,218 @@
+"""Hot-path benchmarks through Flask's test client, with mongomock for Mongo.
+
+Times the request handlers end to end (routing, session, templates, JSON)
+without a network or a real database, so the numbers move only when the
+app's own code does.  Results are written as JSON and each case's median
+is compared with the baseline; the run fails if any case is slower than
+``--threshold`` (default 20%) beyond it, or if there is no baseline.
+
+    python benchmarks/bench_app.py                      # run and compare
+    python benchmarks/bench_app.py --save-baseline      # record a new baseline
+    python benchmarks/bench_app.py --only menu --rounds 500
+
+Needs the app's dependencies plus ``mongomock``.  Baselines are machine
+specific: record one on the machine (or CI runner) that will compare
+against it.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+RESULTS = os.path.join(ROOT, "benchmarks", "results.json")
+SEED_ORDERS = 500
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+
+
+def load_app():
+    """Import the app with mongomock standing in for MongoClient."""
+    import mongomock
+    import pymongo
+
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost/bench")
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+    os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    os.environ.setdefault("ORDER_QUEUE_SPILL_DIR", tempfile.mkdtemp(prefix="bench-orders-"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # mongomock has no command monitoring; drop the listeners it cannot use
+    pymongo.MongoClient = lambda uri=None, event_listeners=None, **options: mongomock.MongoClient()
+
+    import app as roll_app
+    return roll_app
+
+
+def seed_orders(db, count):
+    now = datetime.now(timezone.utc)
+    db["orders"].insert_many([
+        {
+            "order_id": f"RPBENCH{i:06d}",
+            "user_email": EMAIL,
+            "user_name": "Bench",
+            "items": [{"name": "Chicken Tikka Roll", "quantity": 2, "price": 180}],
+            "total": 400,
+            "status": "delivered",
+            "order_date": now - timedelta(minutes=i),
+            "estimated_delivery": now,
+        }
+        for i in range(count)
+    ])
+
+
+class Session:
+    """A logged-in test client with a one-item cart."""
+
+    def __init__(self, roll_app):
+        self.app = roll_app
+        self.client = roll_app.app.test_client()
+        self.client.post("/api/signup", json={
+            "full_name": "Bench", "email": EMAIL, "phone": "9000000000", "password": PASSWORD,
+        })
+        response = self.client.post("/api/login", json={"email": EMAIL, "password": PASSWORD})
+        assert response.get_json()["success"], response.get_json()
+        self.client.post("/api/add_to_cart", json={"id": 1, "type": "roll"})
+        self.line_id = self.client.get("/api/get_cart_info").get_json()["cart"][0]["id"]
+        self.delta = 1
+
+    def check(self, response):
+        assert response.status_code == 200, (response.status_code, response.get_data()[:200])
+        return response
+
+    def add_to_cart(self):
+        self.check(self.client.post("/api/add_to_cart", json={"id": 2, "type": "roll"}))
+
+    def update_cart_qty(self):
+        # Alternate +1/-1 so the cart does not grow across rounds
+        self.check(self.client.post("/api/update_cart_qty", json={"id": self.line_id, "delta": self.delta}))
+        self.delta = -self.delta
+
+    def get_cart_info(self):
+        self.check(self.client.get("/api/get_cart_info"))
+
+    def menu(self):
+        self.app.page_cache.clear()
+        self.check(self.client.get("/menu"))
+
+    def menu_search(self):
+        self.app.page_cache.clear()
+        self.check(self.client.get("/menu?search=chiken&category=chicken"))
+
+    def menu_category(self):
+        self.app.page_cache.clear()
+        self.check(self.client.get("/menu?category=vegetarian"))
+
+    def drinks(self):
+        self.app.page_cache.clear()
+        self.check(self.client.get("/drinks"))
+
+    def place_order(self):
+        self.check(self.client.post("/api/place_order", json={
+            "items": [{"name": "Chicken Tikka Roll", "quantity": 1, "price": 180}], "total": 220,
+        }))
+
+    def get_orders(self):
+        self.check(self.client.get("/api/get-orders?limit=20"))
+
+    def order_details(self):
+        self.check(self.client.get("/api/order_details/RPBENCH000042"))
+
+    def order_details_json(self):
+        self.check(self.client.get("/api/order_details/RPBENCH000042?format=json"))
+
+
+CASES = [
+    "add_to_cart", "update_cart_qty", "get_cart_info", "menu", "menu_search", "menu_category",
+    "drinks", "place_order", "get_orders", "order_details", "order_details_json",
+]
+
+
+def run_case(fn, rounds, warmup):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        "rounds": rounds,
+        "median_us": round(statistics.median(timings), 1),
+        "p95_us": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 1),
+        "ops_per_sec": round(1e6 / statistics.mean(timings), 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print each case against the baseline; return the names that regressed."""
+    regressions = []
+    print(f"{'case':<22}{'median us':>11}{'baseline':>11}{'change':>9}")
+    for name, result in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if not base:
+            print(f"{name:<22}{result['median_us']:>11.1f}{'-':>11}{'new':>9}")
+            continue
+        change = result["median_us"] / base["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<22}{result['median_us']:>11.1f}{base['median_us']:>11.1f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", nargs="*", choices=CASES, help="run just these cases")
+    parser.add_argument("--output", default=RESULTS)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.20, help="allowed slowdown (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    roll_app = load_app()
+    seed_orders(roll_app.get_db(), SEED_ORDERS)
+    session = Session(roll_app)
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": {},
+    }
+    for name in args.only or CASES:
+        results["cases"][name] = run_case(getattr(session, name), args.rounds, args.warmup)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        for name, result in results["cases"].items():
+            print(f"{name:<22}{result['median_us']:>11.1f} us  {result['ops_per_sec']:>9.1f}/s")
+        sys.exit(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        sys.exit(f"Slower than baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
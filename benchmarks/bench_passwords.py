@@ -0,0 +1,84 @@
+"""Login benchmark: password hashing inline vs. in a process pool.
+
+Simulates one threaded app worker serving mixed traffic: a share of the
+requests are logins (one password check), the rest are cheap page views
+(a little CPU and a short wait on I/O).  The same request stream is run
+with ``PasswordHasher(workers=0)`` (hashing on the request thread) and
+with the process pool, and the throughput and p50/p95/p99 latency of each
+request kind are printed.
+
+    python benchmarks/bench_passwords.py [--method scrypt] [--requests 400] [--threads 8]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+def page_view():
+    # Template rendering stand-in plus a database round trip
+    sum(i * i for i in range(2000))
+    time.sleep(0.002)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(hasher, stored_hash, kinds, threads):
+    latencies = {"login": [], "page": []}
+
+    def handle(kind):
+        start = time.perf_counter()
+        if kind == "login":
+            assert hasher.verify(stored_hash, PASSWORD)
+        else:
+            page_view()
+        latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(handle, kinds))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--method", default="scrypt")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--login-share", type=float, default=0.2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    kinds = ["login" if rng.random() < args.login_share else "page" for _ in range(args.requests)]
+    stored_hash = PasswordHasher(args.method, workers=0).hash(PASSWORD)
+
+    print(f"{args.requests} requests, {args.login_share:.0%} logins, {args.threads} threads, method {args.method}")
+    print(f"{'mode':<12}{'req/s':>8}  {'kind':<6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for mode, workers in (("inline", 0), (f"pool x{args.workers}", args.workers)):
+        hasher = PasswordHasher(args.method, workers=workers)
+        hasher.verify(stored_hash, PASSWORD)  # start the pool outside the timing
+        elapsed, latencies = run(hasher, stored_hash, kinds, args.threads)
+        hasher.close()
+        for kind, values in latencies.items():
+            if not values:
+                continue
+            print(f"{mode:<12}{args.requests / elapsed:>8.0f}  {kind:<6}"
+                  f"{statistics.median(values):>9.1f}{percentile(values, 95):>9.1f}{percentile(values, 99):>9.1f}")
+            mode = ""
+
+
+if __name__ == "__main__":
+    main()
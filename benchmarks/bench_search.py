@@ -0,0 +1,75 @@
+"""Menu search benchmark: linear substring scan vs. the inverted index.
+
+Builds synthetic catalogs of growing size (up to 10k items) and times the
+same query mix against both approaches.  The index latency should stay
+roughly flat while the scan grows with the catalog.
+
+    python benchmarks/bench_search.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex  # noqa: E402
+
+PROTEINS = ["chicken", "beef", "paneer", "fish", "pork", "falafel", "tofu", "lamb", "prawn", "egg"]
+STYLES = ["spicy", "classic", "tandoori", "smoky", "crispy", "grilled", "buffalo", "bbq", "peri", "herb"]
+EXTRAS = ["lettuce", "tomato", "cucumber", "cheese", "hummus", "olives", "coleslaw", "pickles",
+          "onion", "peppers", "coriander", "mint", "chutney", "ranch", "chipotle", "yogurt"]
+WRAPS = ["roll", "wrap", "delight", "fusion", "special", "supreme"]
+
+# Broad queries match a fixed fraction of the catalog, so their cost grows
+# with the number of hits; selective ones should stay flat.
+BROAD_QUERIES = ["chick", "spicy beef", "paneer", "chiken", "mint chutney"]
+SELECTIVE_QUERIES = ["crispy fish roll 42", "tofu wrap 7", "supreme 99", "zzz"]
+SIZES = [100, 1000, 5000, 10000]
+ROUNDS = 20
+
+
+def synthetic_catalog(size, seed=7):
+    rng = random.Random(seed)
+    items = []
+    for i in range(size):
+        protein = rng.choice(PROTEINS)
+        name = f"{rng.choice(STYLES).title()} {protein.title()} {rng.choice(WRAPS).title()} {i}"
+        description = " ".join(rng.sample(EXTRAS, 5)) + f" with {protein}"
+        items.append({"id": i, "name": name, "description": description, "category": protein})
+    return items
+
+
+def linear_scan(items, search):
+    return [
+        item
+        for item in items
+        if search.lower() in item["name"].lower()
+        or search.lower() in item.get("description", "").lower()
+    ]
+
+
+def time_per_query(fn, queries, rounds=ROUNDS):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - start) / (rounds * len(queries)) * 1e6
+
+
+def main():
+    for label, queries in (("broad", BROAD_QUERIES), ("selective", SELECTIVE_QUERIES)):
+        print(f"\n{label} queries: {', '.join(queries)}")
+        print(f"{'items':>8} {'build ms':>9} {'scan us/q':>10} {'index us/q':>11} {'speedup':>8}")
+        for size in SIZES:
+            items = synthetic_catalog(size)
+            start = time.perf_counter()
+            index = SearchIndex(items)
+            build_ms = (time.perf_counter() - start) * 1e3
+            scan_us = time_per_query(lambda q: linear_scan(items, q), queries)
+            index_us = time_per_query(lambda q: index.search(q, limit=50), queries)
+            print(f"{size:>8} {build_ms:>9.1f} {scan_us:>10.1f} {index_us:>11.1f} {scan_us / index_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
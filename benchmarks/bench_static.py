@@ -0,0 +1,66 @@
+"""Bytes and estimated download time for the assets base.html loads.
+
+Compares identity, gzip (level 9) and brotli (quality 11, if installed)
+for styles.css and main.js, then estimates how long a first visit spends
+downloading them on typical mobile links.  styles.css is render-blocking
+in <head>; main.js is parsed before the page finishes loading.
+
+The times are an estimate from byte counts and the throttling presets'
+bandwidth and latency (plus TCP slow start), not a measured first paint:
+they leave out DNS/TLS, parsing and rendering.  Measure paint in a
+browser (DevTools or Lighthouse with the same throttling) to confirm.
+
+    python benchmarks/bench_static.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+from compress_static import STATIC_DIR, compress  # noqa: E402
+
+ASSETS = ["css/styles.css", "js/main.js"]
+# name, downlink kbit/s, round-trip ms (Chrome DevTools throttling presets)
+NETWORKS = [("Slow 3G", 400, 2000), ("Fast 3G", 1600, 562), ("4G", 9000, 170)]
+# TCP slow start: initial window of 10 segments, doubling each round trip
+INIT_CWND = 10 * 1460
+
+
+def transfer_ms(size, kbps, rtt_ms):
+    """Estimated transfer time: request round trip plus slow-start rounds plus serialization time."""
+    rounds, window, sent = 0, INIT_CWND, 0
+    while sent < size:
+        sent += window
+        window *= 2
+        rounds += 1
+    return rtt_ms + (rounds - 1) * rtt_ms + size * 8 / kbps
+
+
+def main():
+    totals = {}
+    print(f"{'asset':<16} {'encoding':<9} {'bytes':>9} {'ratio':>6} {'compress ms':>12}")
+    for asset in ASSETS:
+        with open(os.path.join(STATIC_DIR, asset), "rb") as f:
+            data = f.read()
+        start = time.perf_counter()
+        outputs = compress(data)
+        elapsed_ms = (time.perf_counter() - start) * 1e3
+        sizes = {"identity": len(data), **{k: len(v) for k, v in outputs.items()}}
+        for encoding, size in sizes.items():
+            totals[encoding] = totals.get(encoding, 0) + size
+            ms = f"{elapsed_ms:.0f}" if encoding != "identity" else "-"
+            print(f"{asset:<16} {encoding:<9} {size:>9} {size / len(data):>6.2f} {ms:>12}")
+
+    print(f"\nestimated download of {' + '.join(ASSETS)} (sequential, one connection; not measured)")
+    header = f"{'network':<9}" + "".join(f" {'est ' + enc + ' ms':>17}" for enc in totals)
+    print(header + f" {'saved ms':>9}")
+    for name, kbps, rtt in NETWORKS:
+        times = {enc: transfer_ms(size, kbps, rtt) for enc, size in totals.items()}
+        best = min(times.values())
+        row = f"{name:<9}" + "".join(f" {t:>17.0f}" for t in times.values())
+        print(row + f" {times['identity'] - best:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
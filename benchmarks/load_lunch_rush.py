@@ -0,0 +1,244 @@
+"""Lunch-rush load test: many virtual users ordering at once.
+
+Each virtual user repeats a full session against a running app until the
+test ends: sign up (or log in), browse /menu and /drinks, add a few items
+to the cart, open /cart, place the order, then poll /api/get-orders a
+few times.  Users are spread over several processes (threads within
+each), so the load generator itself does not bottleneck on one core's
+GIL.  At the end it prints throughput plus p50/p95/p99 latency and the
+error rate per endpoint.
+
+    python benchmarks/load_lunch_rush.py --url http://127.0.0.1:5000 --users 50 --duration 60
+    python benchmarks/load_lunch_rush.py --mock --users 20 --duration 30
+
+``--mock`` starts the app itself on a local port with mongomock in place
+of MongoDB (see bench_app.py); otherwise point ``--url`` at an app running
+against a local mongod.  Only the standard library is needed for the
+load generator.
+"""
+import argparse
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ROLL_IDS = [1, 2, 3, 4, 5]
+PASSWORD = "lunch-rush-password"
+POLLS = 3
+
+
+class VirtualUser:
+    def __init__(self, base_url, name, think, rng, record):
+        self.base_url = base_url.rstrip("/")
+        self.name = name
+        self.think = think
+        self.rng = rng
+        self.record = record
+        self.signed_up = False
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def pause(self):
+        if self.think:
+            time.sleep(self.rng.expovariate(1 / self.think))
+
+    def request(self, label, path, payload=None, headers=None):
+        """Send one request; record latency and whether it succeeded."""
+        data = None
+        headers = dict(headers or {})
+        if payload is not None:
+            data = json.dumps(payload).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        start = time.perf_counter()
+        body, ok = None, False
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                body = response.read()
+                ok = response.status < 400
+            if ok and response.headers.get_content_type() == "application/json":
+                body = json.loads(body)
+                ok = body.get("success", True) is not False
+        except (urllib.error.URLError, OSError, ValueError):
+            ok = False
+        self.record(label, (time.perf_counter() - start) * 1000, ok)
+        return body if ok else None
+
+    def log_in(self):
+        email = f"{self.name}@loadtest.example.com"
+        if not self.signed_up:
+            self.signed_up = True
+            phone = str(6000000000 + int(uuid.uuid4().int % 3999999999))
+            if self.request("signup", "/api/signup", {
+                "full_name": self.name, "email": email, "phone": phone, "password": PASSWORD,
+            }):
+                return
+        self.request("login", "/api/login", {"email": email, "password": PASSWORD})
+
+    def session(self):
+        self.log_in()
+        self.pause()
+        self.request("menu", "/menu")
+        self.pause()
+        self.request("drinks", "/drinks")
+        self.pause()
+        for _ in range(self.rng.randint(2, 5)):
+            self.request("add_to_cart", "/api/add_to_cart", {"id": self.rng.choice(ROLL_IDS), "type": "roll"})
+            self.pause()
+        self.request("cart", "/cart")
+        cart = self.request("get_cart_info", "/api/get_cart_info")
+        if cart and cart.get("cart"):
+            items = [{"name": i["name"], "quantity": i["quantity"], "price": i["price"]} for i in cart["cart"]]
+            self.pause()
+            self.request("place_order", "/api/place_order", {"items": items, "total": cart["cart_total"]},
+                         headers={"Idempotency-Key": uuid.uuid4().hex})
+        for _ in range(POLLS):
+            self.pause()
+            self.request("get_orders", "/api/get-orders?limit=4")
+        # Start the next session logged out, like a new visit
+        self.request("logout", "/api/logout", {})
+
+
+def run_process(args):
+    """One load-generator process: ``users`` threads until ``deadline``."""
+    base_url, users, first_user, deadline, think, ramp_up, seed = args
+    samples = {}
+    lock = threading.Lock()
+    sessions = [0]
+
+    def record(label, ms, ok):
+        with lock:
+            samples.setdefault(label, []).append((ms, ok))
+
+    def worker(index):
+        time.sleep(ramp_up * index / max(users, 1))
+        rng = random.Random(seed + index)
+        user = VirtualUser(base_url, f"vu{os.getpid()}-{first_user + index}", think, rng, record)
+        while time.time() < deadline:
+            user.session()
+            with lock:
+                sessions[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, sessions[0]
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def report(samples, sessions, elapsed):
+    total = sum(len(v) for v in samples.values())
+    errors = sum(1 for v in samples.values() for _, ok in v if not ok)
+    print(f"\n{sessions} sessions, {total} requests in {elapsed:.1f}s: "
+          f"{total / elapsed:.1f} req/s, {sessions / elapsed * 60:.1f} sessions/min, "
+          f"{errors / max(total, 1):.2%} errors")
+    print(f"{'endpoint':<16}{'count':>7}{'req/s':>8}{'err %':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    summary = {}
+    for label in sorted(samples):
+        latencies = sorted(ms for ms, _ in samples[label])
+        failed = sum(1 for _, ok in samples[label] if not ok)
+        row = {
+            "count": len(latencies),
+            "rps": len(latencies) / elapsed,
+            "error_rate": failed / len(latencies),
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1],
+        }
+        summary[label] = row
+        print(f"{label:<16}{row['count']:>7}{row['rps']:>8.1f}{row['error_rate']:>7.1%}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    return {"sessions": sessions, "requests": total, "elapsed_s": elapsed, "endpoints": summary}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_mock(port):
+    from bench_app import load_app
+
+    load_app().app.run(host="127.0.0.1", port=port, threaded=True, use_reloader=False)
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url + "/", timeout=2).close()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    sys.exit(f"App at {url} did not start within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--mock", action="store_true", help="start the app with mongomock on a free port")
+    parser.add_argument("--users", type=int, default=20, help="virtual users in total")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds to start all users")
+    parser.add_argument("--think", type=float, default=0.5, help="mean think time between steps, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    server = None
+    if args.mock:
+        port = free_port()
+        args.url = f"http://127.0.0.1:{port}"
+        server = multiprocessing.Process(target=serve_mock, args=(port,), daemon=True)
+        server.start()
+    wait_for(args.url)
+
+    processes = max(1, min(args.processes, args.users))
+    print(f"{args.users} virtual users in {processes} processes against {args.url} for {args.duration:.0f}s")
+    deadline = time.time() + args.duration
+    jobs, first = [], 0
+    for i in range(processes):
+        users = args.users // processes + (1 if i < args.users % processes else 0)
+        jobs.append((args.url, users, first, deadline, args.think, args.ramp_up, args.seed + first))
+        first += users
+
+    start = time.time()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(run_process, jobs)
+    elapsed = time.time() - start
+
+    samples, sessions = {}, 0
+    for process_samples, process_sessions in results:
+        sessions += process_sessions
+        for label, values in process_samples.items():
+            samples.setdefault(label, []).extend(values)
+    summary = report(samples, sessions, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    if server:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Server-side carts: the ``Cart`` model and the stores that hold it.
+
+The session cookie only carries a random ``cart_id``; the cart itself lives
+in one of these stores.  Every store keeps plain JSON-compatible dicts
+(``Cart.to_dict()``) so backends can be swapped without touching the routes.
+
+* ``MemoryCartStore`` - bounded LRU inside the worker process.  Fast, but
+  each worker has its own carts, so only use it with a single worker (the
+  app refuses to start with it when ``WEB_CONCURRENCY`` is above 1).
+* ``MongoCartStore`` - one document per cart in a Mongo collection, shared
+  by every worker.  Idle carts are expired by a TTL index.
+"""
+import copy
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def to_paise(price):
+    """Convert a rupee amount (float, int or str) to integer paise."""
+    return int((Decimal(str(price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class Cart:
+    """Cart lines keyed by line id with a running total in integer paise.
+
+    Lines keep the ``price`` field the frontend reads next to an exact
+    ``price_paise``; every mutation adjusts ``total_paise`` by the delta of
+    the one line it touches instead of re-summing the cart.  Adding a
+    catalog item that already has a line bumps that line's quantity, so
+    repeated clicks do not grow the cart.
+    """
+
+    def __init__(self, lines=None, total_paise=0):
+        self.lines = lines if lines is not None else {}
+        self.total_paise = total_paise
+        # (type, item_id) -> line id, for merging repeated catalog items
+        self.lines_by_item = {}
+        for line_id, line in self.lines.items():
+            key = self._item_key(line)
+            if key is not None:
+                self.lines_by_item[key] = line_id
+
+    @staticmethod
+    def _item_key(line):
+        # Custom rolls are never merged: each one is built separately
+        if line.get("custom"):
+            return None
+        return (line.get("type"), line.get("item_id"))
+
+    @classmethod
+    def from_items(cls, items):
+        """Build a cart from a list of cart lines (the older cart format)."""
+        cart = cls()
+        for line in items:
+            # Older carts did not validate quantities; drop empty lines
+            if int(line.get("quantity", 1)) >= 1:
+                cart.add(line)
+        return cart
+
+    @classmethod
+    def from_dict(cls, data):
+        if data is None:
+            return cls()
+        if "lines" not in data:
+            return cls.from_items(data.get("items", []))
+        return cls(data["lines"], data["total_paise"])
+
+    def to_dict(self):
+        return {"lines": self.lines, "total_paise": self.total_paise}
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __contains__(self, line_id):
+        return line_id in self.lines
+
+    @property
+    def total(self):
+        """Cart total in rupees, as the JSON API reports it."""
+        return self.total_paise / 100
+
+    def items(self):
+        """Cart lines in the order they were added."""
+        return list(self.lines.values())
+
+    def add(self, line):
+        """Add a line (a dict with ``id``, ``price`` and ``quantity``).
+
+        Returns the line now holding the item, which is an existing line
+        when the same catalog item was already in the cart.  Raises
+        ValueError for a quantity below 1.
+        """
+        quantity = int(line.get("quantity", 1))
+        if quantity < 1:
+            raise ValueError(f"Invalid quantity: {quantity}")
+        key = self._item_key(line)
+        existing_id = self.lines_by_item.get(key) if key is not None else None
+        if existing_id is not None:
+            return self.set_quantity(existing_id, self.lines[existing_id]["quantity"] + quantity)
+        line["quantity"] = quantity
+        line["price_paise"] = to_paise(line["price"])
+        self.lines[line["id"]] = line
+        if key is not None:
+            self.lines_by_item[key] = line["id"]
+        self.total_paise += line["price_paise"] * line["quantity"]
+        return line
+
+    def set_quantity(self, line_id, quantity):
+        """Set a line's quantity, removing it at zero or below."""
+        line = self.lines[line_id]
+        quantity = int(quantity)
+        if quantity <= 0:
+            self.remove(line_id)
+            return None
+        self.total_paise += line["price_paise"] * (quantity - line["quantity"])
+        line["quantity"] = quantity
+        return line
+
+    def update_quantity(self, line_id, delta):
+        """Change a line's quantity by ``delta``; returns None if it was removed."""
+        return self.set_quantity(line_id, self.lines[line_id]["quantity"] + int(delta))
+
+    def remove(self, line_id):
+        line = self.lines.pop(line_id)
+        key = self._item_key(line)
+        if key is not None and self.lines_by_item.get(key) == line_id:
+            del self.lines_by_item[key]
+        self.total_paise -= line["price_paise"] * line["quantity"]
+        return line
+
+
+class CartStore:
+    def load(self, cart_id):
+        """Return the stored cart dict, or None if there is none."""
+        raise NotImplementedError
+
+    def save(self, cart_id, cart):
+        raise NotImplementedError
+
+    def delete(self, cart_id):
+        raise NotImplementedError
+
+
+class MemoryCartStore(CartStore):
+    def __init__(self, max_carts=10000):
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, cart_id):
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None:
+                return None
+            self._carts.move_to_end(cart_id)
+        # Callers mutate the cart in place; hand out a copy so an unsaved
+        # change never leaks into the store
+        return copy.deepcopy(cart)
+
+    def save(self, cart_id, cart):
+        cart = copy.deepcopy(cart)
+        with self._lock:
+            self._carts[cart_id] = cart
+            self._carts.move_to_end(cart_id)
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+
+    def delete(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def __len__(self):
+        return len(self._carts)
+
+
+class MongoCartStore(CartStore):
+    def __init__(self, get_collection, ttl_seconds=7 * 24 * 3600):
+        # Called on each use so the Mongo client can be created lazily
+        self.get_collection = get_collection
+        self.ttl_seconds = ttl_seconds
+        self._indexed = False
+
+    @property
+    def collection(self):
+        return self.get_collection()
+
+    def _ensure_index(self):
+        if not self._indexed:
+            self.collection.create_index('updated_at', expireAfterSeconds=self.ttl_seconds)
+            self._indexed = True
+
+    def load(self, cart_id):
+        doc = self.collection.find_one({'_id': cart_id}, {'_id': 0, 'cart': 1})
+        return doc['cart'] if doc else None
+
+    def save(self, cart_id, cart):
+        self._ensure_index()
+        self.collection.update_one(
+            {'_id': cart_id},
+            {'$set': {'cart': cart, 'updated_at': datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    def delete(self, cart_id):
+        self.collection.delete_one({'_id': cart_id})
+
+
+def create_cart_store(backend, get_db=None, max_carts=10000):
+    """Build the store named by ``backend`` ("memory" or "mongo")."""
+    if backend == 'memory':
+        return MemoryCartStore(max_carts=max_carts)
+    if backend == 'mongo':
+        return MongoCartStore(lambda: get_db()['carts'])
+    raise ValueError(f"Unknown cart store backend: {backend}")
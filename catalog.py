@@ -0,0 +1,75 @@
+"""In-memory menu catalog built once from MENU_DATA.
+
+Routes used to scan the MENU_DATA lists on every request (``next(...)`` in
+``add_to_cart``, one list comprehension per category in ``drinks``).  The
+catalog indexes the menu a single time so lookups and counts are O(1),
+and builds the text search index used by ``menu`` and ``drinks``.
+"""
+import hashlib
+import json
+
+from search import SearchIndex
+
+# Maps the cart/API item type to its MENU_DATA section
+ITEM_SECTIONS = {
+    "roll": "featured_rolls",
+    "side": "sides",
+    "drink": "drinks",
+}
+
+
+class MenuCatalog:
+    def __init__(self, menu_data):
+        self.menu_data = menu_data
+        # Content hash: changes whenever the menu data does
+        self.version = hashlib.sha256(
+            json.dumps(menu_data, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+        # (item_type, id) -> item; ids are only unique within a type
+        self.items_by_key = {}
+        # item_type -> category -> [items], in menu order
+        self.items_by_category = {}
+        # item_type -> category -> count, "all" included
+        self.category_counts = {}
+        # item_type -> SearchIndex over name/description
+        self.search_indexes = {}
+
+        for item_type, section in ITEM_SECTIONS.items():
+            items = menu_data.get(section, [])
+            categories = {}
+            for item in items:
+                self.items_by_key[(item_type, item["id"])] = item
+                category = item.get("category")
+                if category is not None:
+                    categories.setdefault(category, []).append(item)
+            counts = {"all": len(items)}
+            counts.update((cat, len(members)) for cat, members in categories.items())
+            self.items_by_category[item_type] = categories
+            self.category_counts[item_type] = counts
+            self.search_indexes[item_type] = SearchIndex(items)
+
+    def items(self, item_type):
+        """All items of a type, in menu order."""
+        return self.menu_data.get(ITEM_SECTIONS[item_type], [])
+
+    def get(self, item_type, item_id):
+        """Return the item with ``item_id`` or None."""
+        return self.items_by_key.get((item_type, item_id))
+
+    def by_category(self, item_type, category="all"):
+        """Items of a type in ``category`` ("all" returns every item)."""
+        if category == "all":
+            return self.items(item_type)
+        return self.items_by_category[item_type].get(category, [])
+
+    def counts(self, item_type, categories):
+        """Per-category counts for the given categories (0 when empty)."""
+        type_counts = self.category_counts[item_type]
+        return {cat: type_counts.get(cat, 0) for cat in categories}
+
+    def search(self, item_type, query, category="all"):
+        """Ranked search results for ``query``, optionally within a category."""
+        results = self.search_indexes[item_type].search(query)
+        if category != "all":
+            results = [item for item in results if item.get("category") == category]
+        return results
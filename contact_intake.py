@@ -0,0 +1,147 @@
+"""Buffered contact-form intake.
+
+``submit_contact`` hands the message to ``ContactIntake.submit`` and
+returns; a background thread collects messages and writes them with one
+``insert_many`` when ``batch_size`` have arrived or ``flush_interval``
+seconds have passed since the first one, whichever comes first.  Each
+message gets an outbox document in the same flush, so the notification
+email is sent by the ``OutboxWorker`` rather than on the request path.
+
+``_id``s are assigned before the first attempt, so retrying a flush that
+partly succeeded cannot store a message (or its notification) twice.
+Only transient errors are retried; a message Mongo refuses outright (over
+the document size limit, say) is logged at ERROR and dropped so it cannot
+hold up the messages behind it.
+Messages still buffered when the process exits are flushed by an
+``atexit`` hook.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidDocument
+
+from mongo import is_transient
+from outbox import OUTBOX_COLLECTION, outbox_document
+
+CONTACT_COLLECTION = 'contact_messages'
+DUPLICATE_KEY = 11000
+
+log = logging.getLogger(__name__)
+
+
+class ContactIntakeFull(Exception):
+    pass
+
+
+class ContactIntake:
+    def __init__(self, get_db, batch_size=50, flush_interval=1.0, max_pending=10000, retry_delay=1.0):
+        self.get_db = get_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the flush thread for this process (once; again after a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            threading.Thread(target=self._run, name='contact-intake', daemon=True).start()
+            atexit.register(self.drain)
+
+    def submit(self, message):
+        """Buffer a contact message; raises ContactIntakeFull when the buffer is full."""
+        self.start()
+        message = dict(message, _id=ObjectId())
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            raise ContactIntakeFull() from None
+        return message['_id']
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            while not self.flush(batch):
+                time.sleep(self.retry_delay)
+
+    def flush(self, batch):
+        """Write a batch and its notifications.
+
+        Returns False when a transient error means the batch should be
+        retried, True once it is stored (less any messages Mongo refused).
+        """
+        try:
+            self._write(batch)
+        except (pymongo.errors.PyMongoError, InvalidDocument) as e:
+            if is_transient(e):
+                log.warning("Contact batch write failed, retrying %d messages: %s", len(batch), e)
+                return False
+            if len(batch) > 1:
+                # Write them one at a time to find the message(s) Mongo refuses
+                return all([self.flush([message]) for message in batch])
+            message = batch[0]
+            log.error("Dropping contact message MongoDB refused: %s", e, extra={
+                'contact_id': str(message['_id']), 'user_email': message.get('user_email'),
+                'subject': str(message.get('subject'))[:200],
+            })
+            return True
+        log.info("Stored contact messages", extra={'count': len(batch)})
+        return True
+
+    def _write(self, batch):
+        db = self.get_db()
+        notifications = [
+            outbox_document('contact', {
+                'name': m['name'], 'email': m['email'], 'subject': m['subject'], 'message': m['message'],
+            }, _id=m['_id'])
+            for m in batch
+        ]
+        for collection, docs in ((CONTACT_COLLECTION, batch), (OUTBOX_COLLECTION, notifications)):
+            try:
+                db[collection].insert_many(docs, ordered=False)
+            except pymongo.errors.BulkWriteError as e:
+                # Already stored by an earlier, partly failed attempt
+                if e.details.get('writeConcernErrors') or any(
+                    error.get('code') != DUPLICATE_KEY for error in e.details.get('writeErrors', [])
+                ):
+                    raise
+
+    def drain(self):
+        """Flush whatever is still buffered (at exit)."""
+        if self._pid != os.getpid():
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.flush(batch)
@@ -0,0 +1,187 @@
+"""Application logging: leveled, structured and off the request thread.
+
+``setup_logging`` puts a single ``QueueHandler`` on the root logger, so a
+log call on a request thread only appends the record to an in-memory
+queue; a ``QueueListener`` thread formats and writes it.  Output is one
+JSON object per line (``LOG_FORMAT=text`` for a human-readable layout
+during development).
+
+Structured fields go in ``extra``::
+
+    log.info("Order queued", extra={"order_id": order_id, "user_email": email})
+
+Before a record is queued, any field whose name looks sensitive (password,
+token, cookie, ...) is replaced with ``[REDACTED]``, including inside
+nested dicts, so secrets never reach the queue, let alone the output.
+
+High-volume loggers can be sampled: with ``LOG_SAMPLE="app.requests=0.01"``
+(the default) about one in a hundred ``app.requests`` records below WARNING is kept.
+Warnings and errors are never sampled out.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+REDACTED = "[REDACTED]"
+SENSITIVE_KEYS = ("password", "passwd", "secret", "token", "authorization", "cookie", "api_key")
+
+# Attributes every LogRecord has; anything else came from ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_handler = None
+
+
+def is_sensitive(key):
+    key = str(key).lower()
+    return any(word in key for word in SENSITIVE_KEYS)
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if is_sensitive(k) else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+def record_fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        for key, value in record_fields(record).items():
+            setattr(record, key, REDACTED if is_sensitive(key) else redact(value))
+        if isinstance(record.args, dict):
+            record.args = redact(record.args)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of sub-WARNING records from the configured loggers."""
+
+    def __init__(self, rates):
+        super().__init__()
+        # logger name -> fraction kept; also applies to child loggers
+        self.rates = rates
+
+    def rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def parse_sample_rates(spec):
+    """``"app.requests=0.01,app.cart=0.1"`` -> {"app.requests": 0.01, "app.cart": 0.1}"""
+    rates = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class RecordQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Unlike the stdlib version, keep the message and the traceback
+        # apart (and ``extra`` fields intact) for the JSON formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _start_listener():
+    global _listener
+    if _handler is None:
+        return
+    _listener = QueueListener(_handler.queue, *_handler.targets, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level="INFO", fmt="json", sample_rates=None, stream=None):
+    """Route all logging through a queue to one JSON (or text) stream handler."""
+    global _handler
+    _stop_listener()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = RecordQueueHandler(queue.SimpleQueue())
+    handler.targets = (output,)
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+    handler.addFilter(RedactingFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    first_setup = _handler is None
+    _handler = handler
+    _start_listener()
+    if first_setup:
+        # The listener thread does not survive a fork; give each worker its own
+        os.register_at_fork(after_in_child=_start_listener)
+        atexit.register(_stop_listener)
+
+
+def init_app(app):
+    setup_logging(
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        fmt=os.environ.get("LOG_FORMAT", "json"),
+        sample_rates=parse_sample_rates(os.environ.get("LOG_SAMPLE", "app.requests=0.01")),
+    )
@@ -0,0 +1,270 @@
+"""Request and MongoDB metrics in Prometheus text format.
+
+``init_app`` times every request (per-endpoint latency histogram, status
+counts, in-flight gauge) and serves ``/metrics``.  ``MongoCommandMetrics``
+is a pymongo ``CommandListener`` that times commands per collection and
+command name; pass it to ``MongoClient(event_listeners=[...])``.
+
+Recording is a dict update under a lock, cheap enough to leave on.
+
+With several worker processes each one only sees its own requests.  When
+``METRICS_DIR`` is set, every process writes a snapshot of its metrics to
+``<METRICS_DIR>/metrics-<pid>.json`` every few seconds (and on each
+scrape), and ``/metrics`` adds all snapshots together, whichever worker
+answers.  Snapshots of exited workers keep counting toward counters and
+histograms, as Prometheus expects of counters, but not toward gauges.
+Clear the directory when the server restarts.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+MONGO_COLLECTIONS = ('users', 'orders', 'reviews', 'contact_messages')
+FLUSH_INTERVAL = 5.0
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.', HTTP_BUCKETS),
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status.', None),
+    'http_requests_in_flight': ('gauge', 'Requests currently being handled.', None),
+    'mongodb_command_duration_seconds': ('histogram', 'MongoDB command latency by collection.', MONGO_BUCKETS),
+    'mongodb_command_failures_total': ('counter', 'Failed MongoDB commands by collection.', None),
+    'app_cache_hits_total': ('counter', 'In-process cache hits.', None),
+    'app_cache_misses_total': ('counter', 'In-process cache misses.', None),
+    'app_cache_entries': ('gauge', 'Entries held by in-process caches.', None),
+}
+
+
+class Registry:
+    def __init__(self, snapshot_dir=None):
+        self.snapshot_dir = snapshot_dir
+        # (name, labels) -> value; histograms hold [bucket counts..., +Inf, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        # name -> LRUCache, read when a snapshot is taken
+        self._caches = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name, labels, seconds):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(buckets) + 2)
+            # Non-cumulative here; exposition adds them up
+            counts[bisect_left(buckets, seconds)] += 1
+            counts[-1] += seconds
+
+    def register_cache(self, name, cache):
+        """Report ``cache``'s hits, misses and size (see page_cache.LRUCache)."""
+        self._caches[name] = cache
+
+    def snapshot(self):
+        with self._lock:
+            entries = [
+                [name, list(labels), list(value) if isinstance(value, list) else value]
+                for (name, labels), value in self._values.items()
+            ]
+        for name, cache in self._caches.items():
+            labels = [['cache', name]]
+            entries.append(['app_cache_hits_total', labels, cache.hits])
+            entries.append(['app_cache_misses_total', labels, cache.misses])
+            entries.append(['app_cache_entries', labels, len(cache)])
+        return entries
+
+    # -- multi-process ---------------------------------------------------
+
+    def _path(self, pid):
+        return os.path.join(self.snapshot_dir, f"metrics-{pid}.json")
+
+    def flush(self):
+        if not self.snapshot_dir:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def start_flusher(self):
+        """Write this process's snapshot periodically (once per process)."""
+        if not self.snapshot_dir or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(FLUSH_INTERVAL)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+    def collect(self):
+        """All processes' values added together: {(name, labels): value}."""
+        if not self.snapshot_dir:
+            return {(name, tuple(map(tuple, labels))): value for name, labels, value in self.snapshot()}
+        self.flush()
+        totals = {}
+        for filename in os.listdir(self.snapshot_dir):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            pid = int(filename[len('metrics-'):-len('.json')])
+            try:
+                with open(os.path.join(self.snapshot_dir, filename)) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(pid)
+            for name, labels, value in entries:
+                if METRICS[name][0] == 'gauge' and not alive:
+                    continue
+                key = (name, tuple(map(tuple, labels)))
+                if isinstance(value, list):
+                    current = totals.setdefault(key, [0] * len(value))
+                    for i, v in enumerate(value):
+                        current[i] += v
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        """Prometheus text exposition format."""
+        by_name = {}
+        for (name, labels), value in sorted(self.collect().items()):
+            by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in by_name.get(name, []):
+                if kind != 'histogram':
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MongoCommandMetrics:
+    """pymongo CommandListener timing commands on the given collections.
+
+    pymongo's monitoring module is imported lazily by ``listener()`` so
+    this module can be used without it.
+    """
+
+    def __init__(self, registry, collections=MONGO_COLLECTIONS):
+        self.registry = registry
+        self.collections = frozenset(collections)
+        # (connection, request_id) -> collection, between started and finished
+        self._pending = {}
+
+    def listener(self):
+        from pymongo import monitoring
+
+        metrics = self
+
+        class Listener(monitoring.CommandListener):
+            def started(self, event):
+                metrics.started(event)
+
+            def succeeded(self, event):
+                metrics.finished(event, failed=False)
+
+            def failed(self, event):
+                metrics.finished(event, failed=True)
+
+        return Listener()
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            target = event.command.get('collection')
+        if isinstance(target, str) and target in self.collections:
+            self._pending[(event.connection_id, event.request_id)] = target
+
+    def finished(self, event, failed):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        labels = (('collection', collection), ('command', event.command_name))
+        self.registry.observe('mongodb_command_duration_seconds', labels, event.duration_micros / 1e6)
+        if failed:
+            self.registry.inc('mongodb_command_failures_total', labels)
+
+
+def init_app(app, registry):
+    """Time every request on ``app`` and serve ``/metrics`` from ``registry``."""
+
+    @app.before_request
+    def start_timer():
+        registry.start_flusher()
+        g.metrics_start = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'unmatched'
+        registry.inc('http_requests_in_flight', (('endpoint', g.metrics_endpoint),))
+
+    def record(status):
+        labels = (('endpoint', g.metrics_endpoint), ('method', request.method))
+        registry.observe('http_request_duration_seconds', labels, time.perf_counter() - g.metrics_start)
+        registry.inc('http_requests_total', labels + (('status', str(status)),))
+
+    @app.after_request
+    def record_response(response):
+        if 'metrics_start' in g:
+            record(response.status_code)
+            g.metrics_recorded = True
+        return response
+
+    @app.teardown_request
+    def finish(error=None):
+        if 'metrics_start' not in g:
+            return
+        if not g.get('metrics_recorded'):
+            record(500)  # unhandled exception: after_request never ran
+        registry.inc('http_requests_in_flight', (('endpoint', g.metrics_endpoint),), -1)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
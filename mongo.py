@@ -0,0 +1,318 @@
+"""MongoDB indexes and projections for the app's hot queries.
+
+``ensure_indexes`` runs at startup and is idempotent: ``create_index`` is a
+no-op when an index with the same name and keys already exists.  Each
+index is created on its own, so one that cannot be built (duplicate values
+already in a unique field, say) does not keep the rest from being built.
+
+``encode_cursor``/``decode_cursor``/``keyset_filter`` implement keyset
+pagination on a (date field, _id) pair, newest first.
+
+``MongoConnection`` owns the client: it is created on first use in each
+process, so importing the app needs no database and every forked worker
+opens its own sockets instead of sharing its parent's.
+
+``HOT_QUERIES`` lists every query the request handlers run, in the shape
+they run it; ``find_collection_scans`` explains each one so
+``tools/check_indexes.py`` can fail when any of them would scan a whole
+collection.
+"""
+import base64
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import monitoring
+
+# collection -> [(name, keys, options)]
+INDEXES = {
+    'users': [
+        ('email_unique', [('email', pymongo.ASCENDING)], {'unique': True}),
+        # Partial, so any number of users may have no phone; queries must
+        # say {'$type': 'string'} (phone_query) for the planner to use it
+        ('phone_unique', [('phone', pymongo.ASCENDING)],
+         {'unique': True, 'partialFilterExpression': {'phone': {'$type': 'string'}}}),
+    ],
+    'orders': [
+        # _id breaks ties between orders placed in the same millisecond so
+        # keyset pages never skip or repeat an order
+        ('user_email_order_date_id', [('user_email', pymongo.ASCENDING), ('order_date', pymongo.DESCENDING),
+                                      ('_id', pymongo.DESCENDING)], {}),
+        ('order_date_id', [('order_date', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)], {}),
+        ('order_id_user_email', [('order_id', pymongo.ASCENDING), ('user_email', pymongo.ASCENDING)], {}),
+        # Queued orders can be replayed after a restart; this makes it a no-op
+        ('order_id_unique', [('order_id', pymongo.ASCENDING)], {'unique': True}),
+    ],
+    'reviews': [
+        ('approved_date_id', [('approved', pymongo.ASCENDING), ('date', pymongo.DESCENDING),
+                              ('_id', pymongo.DESCENDING)], {}),
+    ],
+    'outbox': [
+        ('status_next_attempt_at', [('status', pymongo.ASCENDING), ('next_attempt_at', pymongo.ASCENDING)], {}),
+    ],
+    'idempotency_keys': [
+        ('created_at_ttl', [('created_at', pymongo.ASCENDING)], {'expireAfterSeconds': 24 * 60 * 60}),
+    ],
+}
+
+# IndexOptionsConflict, IndexKeySpecsConflict: same name, other definition
+INDEX_CONFLICT_CODES = (85, 86)
+# Server error codes worth retrying: network, failover, timeouts, write concern
+TRANSIENT_CODES = frozenset({6, 7, 50, 64, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436})
+
+# Projections: only fetch what the handler uses, never the password hash
+# unless the handler verifies it.
+EXISTS_EMAIL_PROJECTION = {'_id': 0, 'email': 1}
+EXISTS_PHONE_PROJECTION = {'_id': 0, 'phone': 1}
+# Login also fetches the PROFILE_PROJECTION fields to prime the profile cache
+LOGIN_PROJECTION = {'_id': 0, 'email': 1, 'password': 1, 'full_name': 1, 'name': 1, 'phone': 1, 'created_at': 1}
+PROFILE_PROJECTION = {'_id': 0, 'email': 1, 'phone': 1, 'full_name': 1, 'name': 1, 'created_at': 1}
+ORDER_SUMMARY_PROJECTION = {
+    '_id': 0, 'order_id': 1, 'order_date': 1, 'status': 1, 'total': 1, 'total_amount': 1, 'items': 1,
+}
+ORDER_DETAILS_PROJECTION = {
+    '_id': 0, 'order_id': 1, 'order_date': 1, 'status': 1, 'items': 1, 'subtotal': 1,
+    'delivery_fee': 1, 'total': 1, 'estimated_delivery': 1, 'phone_number': 1, 'updated_at': 1,
+}
+# _id stays in: it is half of the page cursor
+REVIEW_PROJECTION = {
+    'user_name': 1, 'user_avatar': 1, 'customer_title': 1, 'rating': 1, 'title': 1, 'text': 1, 'date': 1,
+}
+
+def phone_query(phone):
+    """Filter for a user's phone that the partial phone_unique index can serve."""
+    return {'phone': {'$eq': phone, '$type': 'string'}}
+
+
+# (description, collection, filter, projection, sort) - example values stand
+# in for the request data
+HOT_QUERIES = [
+    ('check-email', 'users', {'email': 'someone@example.com'}, EXISTS_EMAIL_PROJECTION, None),
+    ('check-phone', 'users', phone_query('9999999999'), EXISTS_PHONE_PROJECTION, None),
+    ('login', 'users', {'email': 'someone@example.com'}, LOGIN_PROJECTION, None),
+    ('profile user', 'users', {'email': 'someone@example.com'}, PROFILE_PROJECTION, None),
+    ('update_profile phone check', 'users',
+     {**phone_query('9999999999'), 'email': {'$ne': 'someone@example.com'}}, {'_id': 1}, None),
+    ('profile orders', 'orders', {'user_email': 'someone@example.com'}, ORDER_SUMMARY_PROJECTION,
+     [('order_date', pymongo.DESCENDING)]),
+    ('profile stats', 'user_order_stats', {'_id': 'someone@example.com'}, None, None),
+    ('get_orders', 'orders', {'user_email': 'someone@example.com'}, {'user_email': 0},
+     [('order_date', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]),
+    ('get_orders all', 'orders', {}, None, [('order_date', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]),
+    ('reviews', 'reviews', {'approved': True}, REVIEW_PROJECTION,
+     [('date', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]),
+    ('order_details', 'orders', {'order_id': 'RP0', 'user_email': 'someone@example.com'},
+     ORDER_DETAILS_PROJECTION, None),
+]
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters for this process, summed over servers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = {'open': 0, 'checked_out': 0, 'waiting': 0, 'created': 0, 'cleared': 0,
+                       'checkout_failures': 0}
+
+    def _add(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.counts[key] += delta
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+
+class MongoConnection:
+    """A MongoClient created lazily, once per process.
+
+    ``client_options`` go to ``MongoClient`` (maxPoolSize, timeouts, ...).
+    ``on_connect(db)`` runs once per new client, e.g. to ensure indexes.
+    """
+
+    def __init__(self, uri, db_name='userauth', event_listeners=(), on_connect=None, **client_options):
+        self.uri = uri
+        self.db_name = db_name
+        self.on_connect = on_connect
+        self.client_options = client_options
+        self.pool_stats = PoolStats()
+        self.event_listeners = [*event_listeners, self.pool_stats]
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Drop the parent's client in forked children; they connect on first use
+        os.register_at_fork(after_in_child=self.reset)
+
+    def client(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.pool_stats.reset()
+                    self._client = pymongo.MongoClient(
+                        self.uri, event_listeners=self.event_listeners, **self.client_options
+                    )
+                    self._pid = os.getpid()
+                    if self.on_connect:
+                        self.on_connect(self._client[self.db_name])
+        return self._client
+
+    def db(self):
+        return self.client()[self.db_name]
+
+    def reset(self):
+        # Forget the client without closing it: closing would also end the
+        # parent's server sessions
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def connected(self):
+        return self._client is not None and self._pid == os.getpid()
+
+    def health(self):
+        """Ping the server; return a dict with pool counters and ping time."""
+        started = time.perf_counter()
+        self.client().admin.command('ping')
+        return {
+            'ping_ms': round((time.perf_counter() - started) * 1000, 2),
+            'pool': self.pool_stats.snapshot(),
+            'max_pool_size': self._client.options.pool_options.max_pool_size,
+        }
+
+
+def encode_cursor(date, _id):
+    """Opaque next-page token for the last document of a page."""
+    raw = json.dumps([date.isoformat(), str(_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (date, ObjectId) from ``encode_cursor``; raises ValueError if invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        date, _id = json.loads(raw)
+        return datetime.fromisoformat(date), ObjectId(_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def keyset_filter(query, field, cursor):
+    """Restrict ``query`` to documents after ``cursor`` in (field, _id) descending order."""
+    if not cursor:
+        return query
+    date, _id = decode_cursor(cursor)
+    after = {'$or': [{field: {'$lt': date}}, {field: date, '_id': {'$lt': _id}}]}
+    return {'$and': [query, after]} if query else after
+
+
+def duplicate_key_field(error):
+    """Name of the unique field a DuplicateKeyError was raised for, if known."""
+    details = error.details or {}
+    for key in ('keyPattern', 'keyValue'):
+        if details.get(key):
+            return next(iter(details[key]))
+    # Older servers only name the index in the message
+    for indexes in INDEXES.values():
+        for name, keys, _ in indexes:
+            if name in str(error):
+                return keys[0][0]
+    return None
+
+
+def is_transient(error):
+    """True for write errors that may succeed when retried."""
+    if isinstance(error, (pymongo.errors.ConnectionFailure, pymongo.errors.WriteConcernError)):
+        return True
+    if isinstance(error, pymongo.errors.BulkWriteError):
+        return bool(error.details.get('writeConcernErrors')) or any(
+            e.get('code') in TRANSIENT_CODES for e in error.details.get('writeErrors', [])
+        )
+    return isinstance(error, pymongo.errors.OperationFailure) and error.code in TRANSIENT_CODES
+
+
+def ensure_indexes(db):
+    """Create every index in INDEXES (safe to call on each startup).
+
+    An index whose definition changed is dropped and built again.  Returns
+    {(collection, name): OperationFailure} for the indexes the server
+    refused to build; connection errors are raised.
+    """
+    failed = {}
+    for collection, indexes in INDEXES.items():
+        for name, keys, options in indexes:
+            try:
+                try:
+                    db[collection].create_index(keys, name=name, **options)
+                except pymongo.errors.OperationFailure as e:
+                    if e.code not in INDEX_CONFLICT_CODES:
+                        raise
+                    db[collection].drop_index(name)
+                    db[collection].create_index(keys, name=name, **options)
+            except pymongo.errors.OperationFailure as e:
+                failed[(collection, name)] = e
+    return failed
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    yield plan.get('stage')
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _plan_stages(child)
+
+
+def find_collection_scans(db):
+    """Explain each hot query; return [(description, winning plan)] for those that COLLSCAN."""
+    scans = []
+    for description, collection, query, projection, sort in HOT_QUERIES:
+        cursor = db[collection].find(query, projection).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()['queryPlanner']['winningPlan']
+        if 'COLLSCAN' in set(_plan_stages(plan)):
+            scans.append((description, plan))
+    return scans
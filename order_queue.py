@@ -0,0 +1,347 @@
+"""Write-behind order intake.
+
+``place_order`` validates the order, assigns its ``order_id`` and hands it
+to an ``OrderQueue``; background writer threads drain the queue into Mongo
+with ``insert_many`` batches, so checkout no longer waits on the order
+insert.
+
+Durability: before an order is queued it is appended to a journal file
+(one per worker process, held with an exclusive ``flock``).  Written
+batches are marked done in the same journal, which is emptied whenever
+nothing is outstanding and otherwise rewritten with just the outstanding
+orders every ``compact_after`` done records, so it stays small under
+steady traffic.  When a process starts it
+replays any journal whose owner is gone, so queued orders survive a
+restart or a crashed worker.  Replays are safe because ``order_id`` has a
+unique index: an order that was written but not yet marked done is
+skipped as a duplicate.
+
+Only transient failures (network errors, failovers, write concern) are
+retried.  An order Mongo refuses outright, such as one over the document
+size limit, is appended to ``failed-orders.jsonl`` in the spill directory
+with its error, logged at ERROR and marked done, so it cannot hold up the
+orders behind it.
+
+``IdempotencyKeys`` maps a client's ``Idempotency-Key`` to the order it
+created, so retried or double-clicked checkouts return the original
+``order_id`` instead of placing a second order.
+"""
+import fcntl
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pymongo
+from bson import json_util
+from bson.errors import InvalidDocument
+
+from mongo import TRANSIENT_CODES, is_transient
+from page_cache import LRUCache
+
+DUPLICATE_KEY = 11000
+FAILED_ORDERS_FILE = "failed-orders.jsonl"
+
+log = logging.getLogger(__name__)
+
+
+class OrderQueueFull(Exception):
+    pass
+
+
+class OrderJournal:
+    """Append-only JSON-lines journal of queued and written orders."""
+
+    def __init__(self, spill_dir, fsync=False, compact_after=1000):
+        self.spill_dir = spill_dir
+        self.fsync = fsync
+        self.compact_after = compact_after
+        self.path = None
+        self._file = None
+        # order_id -> order, for orders queued but not yet written
+        self._pending = {}
+        self._done_records = 0
+        self._lock = threading.Lock()
+
+    def open(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # Unique per process start: a restarted worker may be given the pid
+        # of one that crashed, whose journal must be replayed, not reused
+        self.path = os.path.join(self.spill_dir, f"orders-{os.getpid()}-{uuid.uuid4().hex[:12]}.jsonl")
+        self._file = open(self.path, "a+", encoding="utf-8")
+        self._pending = {}
+        self._done_records = 0
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _append(self, record):
+        self._file.write(json_util.dumps(record) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def put(self, order):
+        with self._lock:
+            self._append({"op": "put", "order": order})
+            self._pending[order["order_id"]] = order
+
+    def done(self, order_ids):
+        with self._lock:
+            self._append({"op": "done", "ids": list(order_ids)})
+            for order_id in order_ids:
+                self._pending.pop(order_id, None)
+            self._done_records += 1
+            # Nothing outstanding: start the journal over
+            if not self._pending:
+                self._file.truncate(0)
+                self._done_records = 0
+            elif self._done_records >= self.compact_after:
+                self._compact()
+
+    def _compact(self):
+        """Replace the journal with one holding only the pending orders."""
+        tmp_path = self.path + ".tmp"  # not *.jsonl, so recover() skips it
+        new_file = open(tmp_path, "a+", encoding="utf-8")
+        fcntl.flock(new_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        new_file.truncate(0)
+        for order in self._pending.values():
+            new_file.write(json_util.dumps({"op": "put", "order": order}) + "\n")
+        new_file.flush()
+        if self.fsync:
+            os.fsync(new_file.fileno())
+        os.replace(tmp_path, self.path)
+        self._file.close()
+        self._file = new_file
+        self._done_records = 0
+
+    def reject(self, failures):
+        """Move ``[(order, error message)]`` to the failed-orders file and mark them done."""
+        path = os.path.join(self.spill_dir, FAILED_ORDERS_FILE)
+        failed_at = datetime.now(timezone.utc)
+        with open(path, "a", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            for order, error in failures:
+                f.write(json_util.dumps({"order": order, "error": error, "failed_at": failed_at}) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.done([order["order_id"] for order, _ in failures])
+
+    def recover(self):
+        """Claim journals left by processes that are gone; return their unwritten orders."""
+        orders = []
+        for name in sorted(os.listdir(self.spill_dir)):
+            path = os.path.join(self.spill_dir, name)
+            if path == self.path or not (name.startswith("orders-") and name.endswith(".jsonl")):
+                continue
+            with open(path, "r+", encoding="utf-8") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # owned by a live worker
+                orders.extend(read_pending(f))
+                os.unlink(path)
+        return orders
+
+
+def read_pending(lines):
+    """Orders in a journal that were queued but never marked done."""
+    pending = {}
+    for line in lines:
+        try:
+            record = json_util.loads(line)
+        except ValueError:
+            continue  # torn last line from a crash
+        if record["op"] == "put":
+            pending[record["order"]["order_id"]] = record["order"]
+        else:
+            for order_id in record["ids"]:
+                pending.pop(order_id, None)
+    return list(pending.values())
+
+
+class OrderQueue:
+    def __init__(self, get_collection, spill_dir, on_written=None, max_size=1000,
+                 workers=2, batch_size=50, retry_delay=0.5, fsync=False):
+        self.get_collection = get_collection
+        self.on_written = on_written
+        self.max_size = max_size
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.journal = OrderJournal(spill_dir, fsync=fsync)
+        self._queue = None
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start writer threads for this process (again after a fork).
+
+        Also replays journals left by processes that are gone.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self.journal.open()
+            recovered = self.journal.recover()
+            for order in recovered:
+                self.journal.put(order)
+            self._threads = [
+                threading.Thread(target=self._run, name=f"order-writer-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            if recovered:
+                log.info("Replaying spilled orders", extra={'count': len(recovered)})
+                self._threads.append(
+                    threading.Thread(target=self._replay, args=(recovered,), name="order-replay", daemon=True)
+                )
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def _replay(self, orders):
+        # Recovered orders may exceed max_size; feed them in as they fit
+        for order in orders:
+            self._queue.put(order)
+
+    def submit(self, order):
+        """Journal and queue an order; raises OrderQueueFull when the queue is full."""
+        self.start()
+        if self._queue.full():
+            raise OrderQueueFull()
+        self.journal.put(order)
+        try:
+            self._queue.put_nowait(order)
+        except queue.Full:
+            # Lost a race for the last slot; the caller writes it directly
+            self.journal.done([order["order_id"]])
+            raise OrderQueueFull() from None
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            retried = False
+            while batch:
+                retry, duplicates, rejected = self._write(batch)
+                if rejected:
+                    for i, error in rejected.items():
+                        log.error("Order rejected by MongoDB, moved to %s: %s", FAILED_ORDERS_FILE, error,
+                                  extra={'order_id': batch[i]["order_id"], 'user_email': batch[i].get("user_email")})
+                    self.journal.reject([(batch[i], error) for i, error in rejected.items()])
+                written = [i for i in range(len(batch)) if i not in retry and i not in rejected]
+                if written:
+                    self.journal.done([batch[i]["order_id"] for i in written])
+                    # A duplicate on the first attempt was written before a
+                    # restart and already counted; on a retry it is most
+                    # likely this worker's own earlier, unacknowledged write
+                    self._written([batch[i] for i in written if retried or i not in duplicates])
+                batch = [order for i, order in enumerate(batch) if i in retry]
+                if batch:
+                    retried = True
+                    time.sleep(self.retry_delay)
+
+    def _written(self, orders):
+        if self.on_written and orders:
+            try:
+                self.on_written(orders)
+            except Exception:
+                log.exception("Order write callback failed")
+
+    def _write(self, batch):
+        """Insert a batch.
+
+        Returns (indexes to retry, indexes already stored, {index: error}
+        for orders that will never be accepted).
+        """
+        try:
+            # insert_many adds _id to the dicts; copies keep the queued orders clean
+            self.get_collection().insert_many([dict(order) for order in batch], ordered=False)
+            return set(), set(), {}
+        except pymongo.errors.BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            duplicates = {error["index"] for error in errors if error.get("code") == DUPLICATE_KEY}
+            retry = {error["index"] for error in errors if error.get("code") in TRANSIENT_CODES}
+            rejected = {error["index"]: error.get("errmsg", "") for error in errors
+                        if error["index"] not in duplicates and error["index"] not in retry}
+            if e.details.get("writeConcernErrors"):
+                # Not known to be durable; writing them again is a harmless duplicate
+                retry = set(range(len(batch))) - duplicates - rejected.keys()
+            if retry:
+                log.warning("Order batch write failed, retrying %d orders", len(retry))
+            return retry, duplicates, rejected
+        except (pymongo.errors.PyMongoError, InvalidDocument) as e:
+            if is_transient(e):
+                log.warning("Order batch write failed, retrying: %s", e)
+                return set(range(len(batch))), set(), {}
+            if len(batch) == 1:
+                return set(), set(), {0: str(e)}
+            # The error is for the whole call; write one at a time to find the bad order
+            retry, duplicates, rejected = set(), set(), {}
+            for i, order in enumerate(batch):
+                one_retry, one_duplicates, one_rejected = self._write([order])
+                if one_retry:
+                    retry.add(i)
+                if one_duplicates:
+                    duplicates.add(i)
+                if one_rejected:
+                    rejected[i] = one_rejected[0]
+            return retry, duplicates, rejected
+
+
+class IdempotencyKeys:
+    """Idempotency-Key -> order_id, per user, shared through Mongo.
+
+    A claim is one insert on the key's ``_id``; a duplicate-key error means
+    the key was already used and the original order id is returned.
+    Recent keys are also kept in a local LRU so retries that land on the
+    same worker skip the round trip.
+    """
+
+    def __init__(self, get_collection, max_local=10000):
+        self.get_collection = get_collection
+        self._local = LRUCache(max_entries=max_local)
+
+    def claim(self, user_email, key, order_id):
+        """Record ``key`` for ``order_id``; return the earlier order id if the key was used."""
+        doc_id = f"{user_email}:{key}"
+        existing = self._local.get(doc_id)
+        if existing is not None:
+            return existing
+        try:
+            self.get_collection().insert_one({
+                '_id': doc_id,
+                'order_id': order_id,
+                'created_at': datetime.now(timezone.utc),
+            })
+        except pymongo.errors.DuplicateKeyError:
+            doc = self.get_collection().find_one({'_id': doc_id}, {'_id': 0, 'order_id': 1})
+            existing = doc['order_id'] if doc else None
+            if existing:
+                self._local.set(doc_id, existing)
+            return existing
+        self._local.set(doc_id, order_id)
+        return None
+
+    def release(self, user_email, key, order_id):
+        """Undo a claim whose order could not be stored, so a retry places it again."""
+        doc_id = f"{user_email}:{key}"
+        self._local.delete(doc_id)
+        self.get_collection().delete_one({'_id': doc_id, 'order_id': order_id})
@@ -0,0 +1,117 @@
+"""Per-user order rollups for the profile page.
+
+One small document per user in ``user_order_stats``:
+
+    {'_id': <user email>, 'order_count': 3, 'total_spent': 2410.5,
+     'last_order_date': <datetime>, 'item_counts': {'Chai Latte': 4, ...}}
+
+``record_order`` keeps it current with a single atomic upsert per order, so
+the profile page reads one document instead of the user's whole order
+history.  ``backfill`` rebuilds every rollup from the orders collection with
+an aggregation pipeline, keying items with the same ``item_key`` and
+``item_quantity`` rules and totals read as ``order_total`` reads them:
+
+    python order_stats.py backfill
+"""
+import os
+import sys
+
+STATS_COLLECTION = 'user_order_stats'
+FAVOURITE_ITEMS = 3
+
+
+def item_key(name):
+    """Field-safe key for an item name ('.' and a leading '$' are not allowed)."""
+    key = str(name).replace('.', '．')
+    return '＄' + key[1:] if key.startswith('$') else key
+
+
+def item_quantity(item):
+    """An order line's quantity as an int; 1 when it is missing or not a number."""
+    try:
+        return int(item.get('quantity', 1))
+    except (ValueError, TypeError):
+        return 1
+
+
+# item_quantity and order_total in the aggregation language, for backfill
+QUANTITY_EXPR = {'$convert': {'input': '$items.quantity', 'to': 'int', 'onError': 1, 'onNull': 1}}
+TOTAL_EXPR = {'$convert': {'input': {'$ifNull': ['$total', '$total_amount']}, 'to': 'double',
+                           'onError': 0, 'onNull': 0}}
+
+
+def order_total(order):
+    """The order's total as a float; 0 when it is missing or not a number."""
+    # Orders store 'total'; very old documents used 'total_amount'
+    try:
+        return float(order.get('total', order.get('total_amount')) or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def record_order(db, order):
+    """Fold one new order into its user's rollup (atomic upsert)."""
+    inc = {'order_count': 1, 'total_spent': order_total(order)}
+    for item in order.get('items', []):
+        field = 'item_counts.' + item_key(item.get('name', 'Unknown'))
+        inc[field] = inc.get(field, 0) + item_quantity(item)
+    db[STATS_COLLECTION].update_one(
+        {'_id': order['user_email']},
+        {'$inc': inc, '$max': {'last_order_date': order['order_date']}},
+        upsert=True,
+    )
+
+
+def get_user_stats(db, user_email):
+    """The user's rollup with the top items as 'favourite_items'."""
+    stats = db[STATS_COLLECTION].find_one({'_id': user_email}) or {}
+    item_counts = stats.get('item_counts', {})
+    favourites = sorted(item_counts.items(), key=lambda kv: -kv[1])[:FAVOURITE_ITEMS]
+    return {
+        'order_count': stats.get('order_count', 0),
+        'total_spent': stats.get('total_spent', 0),
+        'last_order_date': stats.get('last_order_date'),
+        'favourite_items': [{'name': name, 'quantity': qty} for name, qty in favourites],
+    }
+
+
+def backfill(db):
+    """Rebuild every user's rollup from the orders collection."""
+    orders = db['orders']
+    # Totals per user replace whatever rollup exists
+    orders.aggregate([
+        {'$group': {
+            '_id': '$user_email',
+            'order_count': {'$sum': 1},
+            'total_spent': {'$sum': TOTAL_EXPR},
+            'last_order_date': {'$max': '$order_date'},
+        }},
+        {'$merge': {'into': STATS_COLLECTION, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ])
+    # Quantities per (user, item); keys are made here with item_key so they
+    # match the ones record_order writes
+    item_counts = {}
+    for row in orders.aggregate([
+        {'$unwind': '$items'},
+        {'$group': {
+            '_id': {'user': '$user_email', 'name': {'$ifNull': ['$items.name', 'Unknown']}},
+            'quantity': {'$sum': QUANTITY_EXPR},
+        }},
+    ]):
+        counts = item_counts.setdefault(row['_id']['user'], {})
+        key = item_key(row['_id']['name'])
+        counts[key] = counts.get(key, 0) + row['quantity']
+    for user_email, counts in item_counts.items():
+        db[STATS_COLLECTION].update_one({'_id': user_email}, {'$set': {'item_counts': counts}}, upsert=True)
+    return db[STATS_COLLECTION].count_documents({})
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['backfill']:
+        sys.exit('usage: python order_stats.py backfill')
+    import pymongo
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.environ.get('MONGO_URI'))
+    print(f"Rebuilt {backfill(client[os.environ.get('MONGO_DB_NAME', 'userauth')])} user order rollups")
@@ -0,0 +1,169 @@
+"""Notification outbox: deliver messages from a Mongo collection, with retries.
+
+Anything that should notify someone inserts an outbox document in the same
+flush as its own data, and ``OutboxWorker`` delivers it later through a
+pluggable sender, so no request waits on SMTP.
+
+    {'_id': ..., 'kind': 'contact', 'payload': {...}, 'status': 'pending',
+     'attempts': 0, 'next_attempt_at': <datetime>, 'created_at': <datetime>}
+
+A worker claims one due document at a time with ``find_one_and_update``,
+pushing ``next_attempt_at`` forward by a lease, so any number of worker
+processes can share the collection and a document whose worker died is
+simply picked up again when the lease runs out.  Failed sends are retried
+with exponential backoff and jitter until ``max_attempts``, then marked
+``failed``.
+
+A sender is any callable ``send(kind, payload)`` that raises on failure:
+``LogSender`` only logs (the default), ``SMTPSender`` emails.  To try SMTP
+locally, run a stand-in server such as ``python -m aiosmtpd -n -l
+localhost:1025`` and set ``NOTIFY_SENDER=smtp SMTP_PORT=1025``.
+"""
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+import pymongo
+
+OUTBOX_COLLECTION = 'outbox'
+
+log = logging.getLogger(__name__)
+
+
+def outbox_document(kind, payload, _id=None):
+    now = datetime.now(timezone.utc)
+    doc = {
+        'kind': kind,
+        'payload': payload,
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now,
+    }
+    if _id is not None:
+        doc['_id'] = _id
+    return doc
+
+
+class LogSender:
+    def __call__(self, kind, payload):
+        log.info("Notification", extra={'kind': kind, 'subject': payload.get('subject')})
+
+
+class SMTPSender:
+    def __init__(self, host, port, from_addr, to_addr, username=None, password=None, starttls=False,
+                 timeout=10):
+        self.host = host
+        self.port = port
+        self.from_addr = from_addr
+        self.to_addr = to_addr
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def __call__(self, kind, payload):
+        message = EmailMessage()
+        message['From'] = self.from_addr
+        message['To'] = self.to_addr
+        message['Subject'] = f"[{kind}] {payload.get('subject', '')}"
+        if payload.get('email'):
+            message['Reply-To'] = payload['email']
+        message.set_content("\n".join(f"{key}: {value}" for key, value in payload.items()))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+
+def create_sender(name, **smtp_options):
+    """Build the sender named by ``name`` ("log" or "smtp"; only smtp uses the options)."""
+    if name == 'log':
+        return LogSender()
+    if name == 'smtp':
+        return SMTPSender(**smtp_options)
+    raise ValueError(f"Unknown notification sender: {name}")
+
+
+class OutboxWorker:
+    def __init__(self, get_collection, sender, poll_interval=5.0, lease_seconds=60,
+                 max_attempts=8, base_delay=30, max_delay=3600):
+        self.get_collection = get_collection
+        self.sender = sender
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def backoff(self, attempts):
+        """Seconds before retry number ``attempts`` (full jitter)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+
+    def claim(self):
+        now = datetime.now(timezone.utc)
+        return self.get_collection().find_one_and_update(
+            {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+            {'$set': {'next_attempt_at': now + timedelta(seconds=self.lease_seconds)},
+             '$inc': {'attempts': 1}},
+            sort=[('next_attempt_at', pymongo.ASCENDING)],
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+
+    def deliver(self, doc):
+        collection = self.get_collection()
+        try:
+            self.sender(doc['kind'], doc['payload'])
+        except Exception as e:
+            now = datetime.now(timezone.utc)
+            if doc['attempts'] >= self.max_attempts:
+                update = {'status': 'failed', 'last_error': str(e), 'failed_at': now}
+                log.error("Giving up on notification: %s", e, extra={'outbox_id': str(doc['_id'])})
+            else:
+                retry_at = now + timedelta(seconds=self.backoff(doc['attempts']))
+                update = {'next_attempt_at': retry_at, 'last_error': str(e)}
+                log.warning("Notification failed, will retry: %s", e,
+                            extra={'outbox_id': str(doc['_id']), 'attempts': doc['attempts']})
+            collection.update_one({'_id': doc['_id']}, {'$set': update})
+            return False
+        collection.update_one(
+            {'_id': doc['_id']}, {'$set': {'status': 'sent', 'sent_at': datetime.now(timezone.utc)}}
+        )
+        return True
+
+    def run_once(self):
+        """Deliver every due notification; return how many were attempted."""
+        attempted = 0
+        while True:
+            doc = self.claim()
+            if doc is None:
+                return attempted
+            self.deliver(doc)
+            attempted += 1
+
+    def start(self):
+        """Start the delivery thread for this process (once; again after a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='outbox', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except pymongo.errors.PyMongoError as e:
+                log.warning("Outbox poll failed: %s", e)
+            time.sleep(self.poll_interval)
@@ -0,0 +1,128 @@
+"""Caches for rendered HTML: whole pages with strong ETags, and fragments.
+
+Pages such as home, menu and drinks only depend on the menu data, the query
+string and a few session values, so their rendered HTML is kept in a bounded
+LRU and re-rendered only when one of those inputs changes.  Every cached
+response carries an ETag; a matching ``If-None-Match`` gets a 304 with no
+body.
+
+Entries are keyed by endpoint, normalized query args, a content version
+(the catalog version, so a menu change misses every old entry) and the
+session values the templates read.
+
+``LRUCache`` is the bounded, thread-safe store underneath; it is also used
+directly for smaller rendered fragments such as order details.
+``TTLCache`` adds an expiry to each entry for data that may change behind
+the app's back, such as the first page of reviews.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request
+
+
+class LRUCache:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TTLCache(LRUCache):
+    """LRUCache whose entries expire ``ttl`` seconds after they are set."""
+
+    def __init__(self, ttl, max_entries=512):
+        super().__init__(max_entries)
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = super().get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if time.monotonic() >= expires:
+            with self._lock:
+                # Count it as a miss, not the hit LRUCache recorded
+                self.hits -= 1
+                self.misses += 1
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            return None
+        return value
+
+    def set(self, key, value):
+        super().set(key, (time.monotonic() + self.ttl, value))
+
+
+class PageCache(LRUCache):
+    def __init__(self, version, vary=None, max_entries=512):
+        super().__init__(max_entries)
+        # version() -> changes whenever the data behind the pages changes
+        self.version = version
+        # vary() -> hashable tuple of the per-visitor values pages render
+        self.vary = vary or (lambda: ())
+
+    def key(self):
+        args = tuple(sorted((name, tuple(sorted(values))) for name, values in request.args.lists()))
+        return (request.endpoint, args, self.version(), self.vary())
+
+    def cached(self, view):
+        """Decorator: serve ``view`` from the cache (GET only, 200 responses)."""
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+            key = self.key()
+            entry = self.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                entry = {
+                    "body": body,
+                    "mimetype": response.mimetype,
+                    "etag": hashlib.sha256(body).hexdigest()[:32],
+                }
+                self.set(key, entry)
+            response = make_response(entry["body"])
+            response.mimetype = entry["mimetype"]
+            response.set_etag(entry["etag"])
+            # Pages carry per-user bits: browsers may keep them but must
+            # revalidate, which costs a 304 when nothing changed
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response.make_conditional(request)
+        return decorated_function
@@ -0,0 +1,79 @@
+"""Password hashing off the request thread.
+
+werkzeug's password KDFs are deliberately slow and CPU-bound; run inline,
+a burst of logins holds the GIL and stalls every other request in the
+worker.  ``PasswordHasher`` runs them in a small process pool instead, and
+bounds how many can be in flight so a login storm queues on the hashing
+slots rather than piling up work.
+
+The method and cost are configurable (``PASSWORD_HASH_METHOD``, e.g.
+``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``).  Stored hashes carry
+the parameters they were made with, so ``needs_rehash`` can tell when one
+is older than the current setting and login can upgrade it.
+
+``workers=0`` hashes inline, which is what ``benchmarks/bench_passwords.py``
+compares against.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    def __init__(self, method="scrypt", salt_length=16, workers=None, max_pending=None):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or self.workers * 2
+        # "scrypt" is stored as "scrypt:32768:8:1"; the cheapest way to learn
+        # the expansion for this werkzeug version is to ask it once.  That
+        # costs one full KDF run, so it is done here at startup rather than
+        # by the first login's needs_rehash
+        self._method_prefix = generate_password_hash("", method, 1).split("$", 1)[0]
+        self._pool = None
+        self._pid = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # Pools do not survive a fork; each worker process starts its own.
+        # Hashing processes come from a forkserver: forking this already
+        # threaded process could deadlock them, and would rerun its at-fork
+        # hooks (a log listener thread in each one)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        with self._slots:
+            return self._executor().submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def method_prefix(self):
+        """The configured method with werkzeug's defaults filled in."""
+        return self._method_prefix
+
+    def needs_rehash(self, stored_hash):
+        """True when ``stored_hash`` was made with different parameters."""
+        return stored_hash.split("$", 1)[0] != self.method_prefix()
+
+    def close(self):
+        with self._lock:
+            if self._pool and self._pid == os.getpid():
+                self._pool.shutdown(wait=False)
+            self._pool = None
+            self._pid = None
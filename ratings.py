@@ -0,0 +1,144 @@
+"""Live per-item ratings from customer reviews.
+
+One small document per rated item in ``item_ratings``:
+
+    {'_id': 'roll:3', 'count': 12, 'sum': 55, 'histogram': {'5': 8, '4': 3, '3': 1}}
+
+``record_rating`` folds each review into it with a single atomic ``$inc``.
+Pages never query it: ``RatingsSnapshot`` reloads the whole collection in
+a background thread every ``interval`` seconds and calls ``on_change``
+when it differs, and the app rebuilds the catalog with ``apply_ratings``,
+which also moves the catalog version so cached pages re-render.
+
+``backfill`` rebuilds every rollup from the reviews collection:
+
+    python ratings.py backfill
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from catalog import ITEM_SECTIONS
+
+RATINGS_COLLECTION = 'item_ratings'
+
+log = logging.getLogger(__name__)
+
+
+def rating_key(item_type, item_id):
+    return f"{item_type}:{item_id}"
+
+
+def record_rating(db, item_type, item_id, rating):
+    """Fold one review's rating (1-5) into the item's rollup (atomic upsert)."""
+    db[RATINGS_COLLECTION].update_one(
+        {'_id': rating_key(item_type, item_id)},
+        {'$inc': {'count': 1, 'sum': rating, f'histogram.{rating}': 1}},
+        upsert=True,
+    )
+
+
+def load_ratings(db):
+    """{'roll:3': {'count', 'average', 'histogram'}} for every rated item."""
+    ratings = {}
+    for doc in db[RATINGS_COLLECTION].find():
+        if doc.get('count'):
+            ratings[doc['_id']] = {
+                'count': doc['count'],
+                'average': round(doc['sum'] / doc['count'], 1),
+                'histogram': doc.get('histogram', {}),
+            }
+    return ratings
+
+
+def apply_ratings(menu_data, ratings):
+    """Copy of ``menu_data`` with live ratings on the items that have reviews.
+
+    Items without reviews keep their menu ``rating``.
+    """
+    if not ratings:
+        return menu_data
+    menu_data = copy.deepcopy(menu_data)
+    for item_type, section in ITEM_SECTIONS.items():
+        for item in menu_data.get(section, []):
+            live = ratings.get(rating_key(item_type, item['id']))
+            if live:
+                item['rating'] = live['average']
+                item['rating_count'] = live['count']
+    return menu_data
+
+
+class RatingsSnapshot:
+    def __init__(self, load, interval=30, on_change=None):
+        # load() -> ratings dict, as from load_ratings
+        self.load = load
+        self.interval = interval
+        self.on_change = on_change
+        self.ratings = {}
+        self.version = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        ratings = self.load()
+        version = hashlib.sha256(json.dumps(ratings, sort_keys=True).encode()).hexdigest()[:16]
+        if version != self.version:
+            self.ratings, self.version = ratings, version
+            if self.on_change:
+                self.on_change(ratings)
+
+    def start(self):
+        """Start the refresh thread for this process (once; again after a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='ratings-refresh', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("Could not refresh item ratings")
+            time.sleep(self.interval)
+
+
+def backfill(db):
+    """Rebuild every item's rollup from the reviews collection."""
+    db[RATINGS_COLLECTION].delete_many({})
+    db['reviews'].aggregate([
+        {'$match': {'item_id': {'$ne': None}, 'rating': {'$gte': 1, '$lte': 5}}},
+        {'$group': {
+            '_id': {'key': {'$concat': [{'$ifNull': ['$item_type', 'roll']}, ':', {'$toString': '$item_id'}]},
+                    'rating': '$rating'},
+            'n': {'$sum': 1},
+        }},
+        {'$group': {
+            '_id': '$_id.key',
+            'count': {'$sum': '$n'},
+            'sum': {'$sum': {'$multiply': ['$_id.rating', '$n']}},
+            'histogram': {'$push': {'k': {'$toString': '$_id.rating'}, 'v': '$n'}},
+        }},
+        {'$set': {'histogram': {'$arrayToObject': '$histogram'}}},
+        {'$merge': {'into': RATINGS_COLLECTION, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ])
+    return db[RATINGS_COLLECTION].count_documents({})
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['backfill']:
+        sys.exit('usage: python ratings.py backfill')
+    import pymongo
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.environ.get('MONGO_URI'))
+    print(f"Rebuilt {backfill(client[os.environ.get('MONGO_DB_NAME', 'userauth')])} item rating rollups")
@@ -0,0 +1,160 @@
+"""Inverted-index text search over menu items.
+
+Each item is tokenized once when the index is built.  A query then costs
+a few dictionary lookups per query token instead of a substring scan over
+every item:
+
+* exact token hits score highest,
+* a query token that is a prefix of indexed tokens matches them
+  ("chick" -> "chicken"), so search-as-you-type keeps working,
+* a token one edit away (insert/delete/substitute) matches as a typo
+  ("chiken" -> "chicken") when nothing better was found.
+
+Every query token has to match somewhere in the item; items are ranked by
+the summed, field-weighted score and then by menu order.
+"""
+import heapq
+import re
+from bisect import bisect_left
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Score multipliers for how a query token matched an indexed token
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.6
+TYPO_SCORE = 0.4
+
+# Fields searched, with their weight in the ranking
+DEFAULT_FIELDS = (("name", 3.0), ("description", 1.0))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _deletes(token):
+    """The token plus every variant with one character removed."""
+    variants = {token}
+    for i in range(len(token)):
+        variants.add(token[:i] + token[i + 1:])
+    return variants
+
+
+class SearchIndex:
+    def __init__(self, items, fields=DEFAULT_FIELDS, min_prefix=1,
+                 min_typo_length=4, max_expansions=64):
+        self.items = list(items)
+        self.min_prefix = min_prefix
+        self.min_typo_length = min_typo_length
+        self.max_expansions = max_expansions
+        # token -> {item position: field-weighted score}
+        self.postings = {}
+        for pos, item in enumerate(self.items):
+            for field, weight in fields:
+                for token in tokenize(item.get(field, "")):
+                    doc_scores = self.postings.setdefault(token, {})
+                    doc_scores[pos] = max(doc_scores.get(pos, 0.0), weight)
+        # Sorted vocabulary for prefix ranges
+        self.vocabulary = sorted(self.postings)
+        # One-deletion neighbourhood -> tokens, for edit-distance-1 lookups
+        self.deletion_index = {}
+        for token in self.vocabulary:
+            if len(token) >= self.min_typo_length:
+                for variant in _deletes(token):
+                    self.deletion_index.setdefault(variant, []).append(token)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _prefix_tokens(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        matches = []
+        for token in self.vocabulary[start:start + self.max_expansions + 1]:
+            if not token.startswith(prefix):
+                break
+            if token != prefix:
+                matches.append(token)
+        return matches
+
+    def _typo_tokens(self, token):
+        matches = set()
+        for variant in _deletes(token):
+            for candidate in self.deletion_index.get(variant, ()):
+                if candidate != token and _within_one_edit(token, candidate):
+                    matches.add(candidate)
+        return matches
+
+    def _expand(self, token):
+        """Return [(indexed token, score multiplier)] for one query token."""
+        expansions = []
+        if token in self.postings:
+            expansions.append((token, EXACT_SCORE))
+        if len(token) >= self.min_prefix:
+            expansions.extend((t, PREFIX_SCORE) for t in self._prefix_tokens(token))
+        if not expansions and len(token) >= self.min_typo_length:
+            expansions.extend((t, TYPO_SCORE) for t in self._typo_tokens(token))
+        return expansions
+
+    def search(self, query, limit=None):
+        """Return matching items, best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        expanded = []
+        for token in tokens:
+            expansions = self._expand(token)
+            if not expansions:
+                return []
+            size = sum(len(self.postings[t]) for t, _ in expansions)
+            expanded.append((size, expansions))
+        # Materialize only the most selective token; the others are probed
+        # for those candidates, so cost follows the smallest posting list.
+        expanded.sort(key=lambda entry: entry[0])
+        totals = {}
+        for indexed_token, multiplier in expanded[0][1]:
+            for pos, weight in self.postings[indexed_token].items():
+                score = weight * multiplier
+                if score > totals.get(pos, 0.0):
+                    totals[pos] = score
+        for _, expansions in expanded[1:]:
+            narrowed = {}
+            for pos, total in totals.items():
+                best = 0.0
+                for indexed_token, multiplier in expansions:
+                    weight = self.postings[indexed_token].get(pos)
+                    if weight is not None and weight * multiplier > best:
+                        best = weight * multiplier
+                if best:
+                    narrowed[pos] = total + best
+            totals = narrowed
+            if not totals:
+                return []
+
+        def rank(pos):
+            return (-totals[pos], pos)
+
+        if limit is None:
+            ranked = sorted(totals, key=rank)
+        else:
+            ranked = heapq.nsmallest(limit, totals, key=rank)
+        return [self.items[pos] for pos in ranked]
+
+
+def _within_one_edit(a, b):
+    """True when a and b differ by at most one insert, delete or substitution."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+        else:
+            i += 1
+        j += 1
+    return edits + (len(b) - j) + (len(a) - i) <= 1
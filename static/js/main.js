@@ -1589,6 +1589,33 @@ const initialReviews = [
 
 let reviews = [...initialReviews];
 
+function escapeHtml(value) {
+  const div = document.createElement('div');
+  div.textContent = value == null ? '' : String(value);
+  return div.innerHTML.replace(/"/g, '&quot;');
+}
+
+// Newest approved reviews from the server; the samples above show until there are some.
+// They are other people's text, so escape them for renderReviews' innerHTML.
+function loadServerReviews() {
+  fetch('/api/reviews')
+    .then(res => res.json())
+    .then(data => {
+      if (!data.success || !data.reviews.length) return;
+      reviews = data.reviews.map(review => ({
+        name: escapeHtml(review.user_name),
+        title: escapeHtml(review.customer_title),
+        rating: Math.min(Math.max(parseInt(review.rating, 10) || 0, 0), 5),
+        reviewTitle: escapeHtml(review.title),
+        text: escapeHtml(review.text),
+        date: new Date(review.date).toLocaleDateString(),
+        avatar: escapeHtml(review.user_avatar)
+      }));
+      renderReviews();
+    })
+    .catch(() => {});
+}
+
 function renderReviews() {
   const reviewsRow = document.getElementById('reviewsRow');
   if (!reviewsRow) return;
@@ -1643,6 +1670,7 @@ function confettiBurst() {
 
 document.addEventListener('DOMContentLoaded', function() {
   renderReviews();
+  loadServerReviews();
   
   // Set user info display if available
   if (window.signedInUser) {
@@ -1689,16 +1717,29 @@ document.addEventListener('DOMContentLoaded', function() {
       // Use email for avatar (more consistent)
       const avatar = `https://www.gravatar.com/avatar/${email.toLowerCase().trim()}?d=mp&s=100`;
       
-      reviews.unshift({ name, rating, text, date, avatar });
-      renderReviews();
-      addReviewForm.reset();
-      
-      // Reset star rating
-      document.getElementById('star5').checked = true;
-      updateRatingText(5);
-      
-      showToast('Thank you for your review!', 'success');
-      confettiBurst();
+      fetch('/api/submit-review', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ rating, text })
+      })
+        .then(res => res.json())
+        .then(result => {
+          if (!result.success) {
+            showToast(result.message || 'Could not submit your review.', 'error');
+            return;
+          }
+          reviews.unshift({ name, rating, text, date, avatar });
+          renderReviews();
+          addReviewForm.reset();
+
+          // Reset star rating
+          document.getElementById('star5').checked = true;
+          updateRatingText(5);
+
+          showToast('Thank you for your review!', 'success');
+          confettiBurst();
+        })
+        .catch(() => showToast('Could not submit your review.', 'error'));
     });
   }
 });
@@ -0,0 +1,142 @@
+"""Build responsive, content-hashed image variants for static/images.
+
+    python tools/build_images.py
+
+For every image in static/images this:
+
+* hashes the file and builds each distinct set of bytes once, so the
+  duplicated ingredient/placeholder images cost one set of variants,
+* writes WebP (and AVIF when Pillow supports it) at the widths the cards
+  actually display, never upscaling the original,
+* writes a resized fallback in the original format for browsers without
+  WebP/AVIF support,
+* names every output ``<stem>.<hash>.<width>.<ext>`` under static/build/images
+  so it can be served with a far-future Cache-Control,
+* writes manifest.json mapping each original URL to its variants; the
+  ``responsive_image`` template helper (assets.py) reads it.
+
+Requires Pillow.  AVIF needs Pillow built with libavif or pillow-avif-plugin.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from PIL import Image, features
+
+try:  # Registers the AVIF codec on Pillow builds without native support
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = os.path.join(ROOT, "static", "images")
+BUILD_DIR = os.path.join(ROOT, "static", "build", "images")
+SOURCE_URL = "/static/images/"
+BUILD_URL = "/static/build/images/"
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".avif"}
+# 96px covers the 48px ingredient thumbnails at 2x; 200-800px the menu and
+# home cards (about 400px wide) at 1x-2x; 1200px the hero roll
+WIDTHS = [96, 200, 400, 800, 1200]
+QUALITY = {"webp": 80, "avif": 55, "jpeg": 82}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def avif_supported():
+    try:
+        return bool(features.check("avif"))
+    except ValueError:
+        return "AVIF" in Image.SAVE
+
+
+def slug(name):
+    stem = os.path.splitext(name)[0].strip().lower()
+    return "".join(c if c.isalnum() else "-" for c in stem).strip("-") or "image"
+
+
+def save_variant(image, width, fmt, out_stem):
+    height = round(image.height * width / image.width)
+    resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+    ext = {"jpeg": "jpg"}.get(fmt, fmt)
+    if fmt == "jpeg" and resized.mode not in ("RGB", "L"):
+        resized = resized.convert("RGB")
+    filename = f"{out_stem}.{width}.{ext}"
+    options = {"quality": QUALITY[fmt]} if fmt in QUALITY else {"optimize": True}
+    if fmt == "webp":
+        options["method"] = 6
+    if fmt == "jpeg":
+        options.update(optimize=True, progressive=True)
+    resized.save(os.path.join(BUILD_DIR, filename), fmt.upper(), **options)
+    return {"width": width, "height": height, "url": BUILD_URL + filename}
+
+
+def build_entry(path, digest, formats):
+    with Image.open(path) as image:
+        image.load()
+    if image.mode == "P":
+        image = image.convert("RGBA")
+    out_stem = f"{slug(os.path.basename(path))}.{digest[:10]}"
+    widths = [w for w in WIDTHS if w < image.width] + [min(image.width, WIDTHS[-1])]
+    widths = sorted(set(widths))
+    entry = {
+        "hash": digest,
+        "width": image.width,
+        "height": image.height,
+        "variants": {fmt: [save_variant(image, w, fmt, out_stem) for w in widths] for fmt in formats},
+    }
+    has_alpha = image.mode in ("RGBA", "LA")
+    entry["fallback"] = save_variant(image, widths[-1], "png" if has_alpha else "jpeg", out_stem)
+    return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-avif", action="store_true", help="only build WebP variants")
+    args = parser.parse_args(argv)
+
+    formats = ["webp"]
+    if not args.no_avif:
+        if avif_supported():
+            formats.insert(0, "avif")
+        else:
+            print("AVIF encoder not available; building WebP only", file=sys.stderr)
+
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    by_hash = {}
+    manifest = {}
+    source_bytes = built_bytes = 0
+    for name in sorted(os.listdir(SOURCE_DIR)):
+        path = os.path.join(SOURCE_DIR, name)
+        if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS or not os.path.isfile(path):
+            continue
+        digest = file_hash(path)
+        if digest not in by_hash:
+            source_bytes += os.path.getsize(path)
+            by_hash[digest] = build_entry(path, digest, formats)
+            print(f"built  {name}")
+        else:
+            print(f"dedup  {name}")
+        manifest[SOURCE_URL + name] = by_hash[digest]
+
+    for entry in by_hash.values():
+        for variants in entry["variants"].values():
+            for variant in variants:
+                built_bytes += os.path.getsize(os.path.join(ROOT, variant["url"].lstrip("/")))
+
+    with open(os.path.join(BUILD_DIR, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    print(f"{len(manifest)} images, {len(by_hash)} unique; "
+          f"{source_bytes / 1e6:.1f} MB of unique originals -> {built_bytes / 1e6:.1f} MB of variants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Fail if any hot query would do a collection scan.
+
+    python tools/check_indexes.py
+
+Creates the indexes from mongo.INDEXES (idempotent), then runs explain() on
+every query in mongo.HOT_QUERIES against the database in MONGO_URI and
+exits non-zero if an index could not be created or a winning plan
+contains a COLLSCAN stage.
+"""
+import json
+import os
+import sys
+
+import pymongo
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongo import HOT_QUERIES, ensure_indexes, find_collection_scans  # noqa: E402
+
+
+def main():
+    load_dotenv()
+    client = pymongo.MongoClient(os.environ.get('MONGO_URI'))
+    db = client[os.environ.get('MONGO_DB_NAME', 'userauth')]
+    failed = ensure_indexes(db)
+    for (collection, name), error in failed.items():
+        print(f"INDEX FAILED: {collection}.{name}: {error}")
+    scans = find_collection_scans(db)
+    for description, plan in scans:
+        print(f"COLLSCAN: {description}\n{json.dumps(plan, indent=2, default=str)}")
+    print(f"{len(HOT_QUERIES) - len(scans)}/{len(HOT_QUERIES)} hot queries use an index")
+    return 1 if scans or failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
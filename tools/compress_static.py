@@ -0,0 +1,61 @@
+"""Write precompressed .br and .gz siblings for text assets in static/.
+
+    python tools/compress_static.py
+
+The static handler in assets.py serves ``styles.css.br`` / ``styles.css.gz``
+instead of ``styles.css`` when the browser accepts that encoding, so the
+compression cost is paid once at build time at the highest level.  Brotli
+output needs the ``brotli`` package; gzip uses the standard library.
+"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, "static")
+TEXT_EXTENSIONS = {".css", ".js", ".svg", ".json", ".html", ".txt", ".map"}
+# Files smaller than this gain nothing once headers are counted
+MIN_SIZE = 1024
+
+
+def compress(data):
+    """Return {"gz": bytes, "br": bytes} for ``data`` (br only with brotli installed)."""
+    outputs = {"gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        outputs["br"] = brotli.compress(data, quality=11, mode=brotli.MODE_TEXT)
+    return outputs
+
+
+def text_assets(static_dir=STATIC_DIR):
+    for dirpath, _, filenames in os.walk(static_dir):
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1] in TEXT_EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+
+def main():
+    if brotli is None:
+        print("brotli not installed; writing .gz only")
+    for path in text_assets():
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MIN_SIZE:
+            continue
+        sizes = []
+        for ext, compressed in compress(data).items():
+            # Only keep an encoding that actually saves bytes
+            if len(compressed) >= len(data):
+                continue
+            with open(f"{path}.{ext}", "wb") as f:
+                f.write(compressed)
+            sizes.append(f"{ext} {len(compressed) / 1024:.0f} KB")
+        rel = os.path.relpath(path, STATIC_DIR)
+        print(f"{rel}: {len(data) / 1024:.0f} KB -> {', '.join(sizes) or 'skipped'}")
+
+
+if __name__ == "__main__":
+    main()